@@ -0,0 +1,105 @@
+"""
+Alt text cache - persistent content-addressed results, keyed by image URL, approach, model,
+prompt version and normalized context
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+
+def normalize_context(text):
+    """Whitespace-insensitive form of the context used in cache keys"""
+    return " ".join(str(text or "").split())
+
+def cache_key(*parts):
+    """SHA-256 over the JSON-encoded key parts"""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class AltTextCache:
+    """SQLite cache of generation results with size- and age-based eviction
+
+    Two kinds of entries:
+    - "alt": final result of an approach for one (image, context) pair
+    - "description": approach 1 step 1 image description, reused across contexts
+    """
+
+    def __init__(self, path, max_entries=100000, max_age_days=90):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        self.stats = {"hits": 0, "misses": 0, "description_hits": 0, "description_misses": 0}
+        self.puts = 0
+        self.evict()
+
+    def _get(self, key):
+        row = self.conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.max_age:
+            return None
+        self.conn.execute("UPDATE cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def _put(self, key, kind, value):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO cache (key, kind, value, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, kind, json.dumps(value, ensure_ascii=False), now, now)
+        )
+        self.conn.commit()
+        self.puts += 1
+        if self.puts % 1000 == 0:
+            self.evict()
+
+    @staticmethod
+    def result_key(img_url, approach, model, prompt_version, context, php_file="", current_alt=""):
+        return cache_key("alt", img_url, approach, model, prompt_version,
+                         normalize_context(context), php_file, current_alt)
+
+    @staticmethod
+    def description_key(img_url, model, prompt_version):
+        return cache_key("description", img_url, model, prompt_version)
+
+    def get_result(self, key):
+        """Cached result dict (success/alt_text/status/image_description) or None"""
+        value = self._get(key)
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    def put_result(self, key, result):
+        """Stores successful results only - errors are retried next time"""
+        if result.get("success"):
+            self._put(key, "alt", result)
+
+    def get_description(self, key):
+        value = self._get(key)
+        self.stats["description_hits" if value is not None else "description_misses"] += 1
+        return value
+
+    def put_description(self, key, description):
+        self._put(key, "description", description)
+
+    def evict(self):
+        """Drops entries older than max_age, then the least recently used ones over max_entries"""
+        self.conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.max_age,))
+        self.conn.execute("""
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
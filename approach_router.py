@@ -0,0 +1,109 @@
+"""
+Approach router - picks the cheapest generation approach that fits each image
+Classification uses only what is already in the table (URL, filename, template file, context),
+so routing costs nothing. Clear cases go to text-only approach 3, ambiguous content images
+escalate to the vision approaches.
+"""
+
+import os
+import re
+from urllib.parse import unquote, urlparse
+
+from image_records import is_absolute_url
+
+# Filename words of images that carry no content (alt should usually be empty)
+DECORATIVE_WORDS = {
+    'spacer', 'divider', 'separator', 'bg', 'background', 'pattern', 'texture', 'shadow', 'border',
+    'bullet', 'arrow', 'gradient', 'placeholder', 'pixel', 'blank', 'transparent', 'overlay', 'dots'
+}
+
+# Filename words of logos and icons - the alt comes from the name/function, not from the pixels
+ICON_WORDS = {
+    'logo', 'logotype', 'icon', 'icons', 'ico', 'favicon', 'sprite', 'badge', 'emblem', 'social',
+    'facebook', 'twitter', 'linkedin', 'instagram', 'youtube', 'pinterest', 'tiktok', 'whatsapp',
+    'email', 'search', 'menu', 'hamburger', 'cart'
+}
+ICON_EXTENSIONS = ('.svg', '.ico')
+ICON_PATH_PATTERN = re.compile(r'/(?:icons?|logos?|sprites?|flags?|emoji)/', re.IGNORECASE)
+
+# Template files that hold site chrome (header, footer, navigation) rather than content - whole
+# path segments or name parts only (header.php, parts/nav-main.php), not 'navy-blue-sofa'
+CHROME_TEMPLATE_PATTERN = re.compile(r'(?:^|[/\\_-])(?:header|footer|sidebar|nav|navigation|menu|widget|searchform)'
+                                     r'(?=$|[/\\._-])', re.IGNORECASE)
+# php_file values that are template files - anything else is a post URL or permalink (content)
+TEMPLATE_EXTENSIONS = ('.php', '.phtml', '.twig', '.tpl')
+
+# Words that say nothing about the content of a photo
+GENERIC_WORDS = {
+    'img', 'image', 'images', 'photo', 'photos', 'pic', 'picture', 'dsc', 'dscn', 'dcim', 'pxl', 'screenshot',
+    'screen', 'shot', 'untitled', 'copy', 'final', 'edited', 'edit', 'scaled', 'rotated', 'wp', 'new', 'old',
+    'min', 'large', 'medium', 'small', 'thumb', 'thumbnail', 'full', 'web', 'jpg', 'jpeg', 'png', 'webp'
+}
+
+# WordPress size/edit suffixes: -300x200, -scaled, -rotated, -e1612345678901, @2x
+WORDPRESS_SUFFIX_PATTERN = re.compile(r'(?:-\d+x\d+|-scaled|-rotated|-e\d{10,}|@\dx)+$', re.IGNORECASE)
+WORD_PATTERN = re.compile(r'[a-z]+', re.IGNORECASE)
+
+# Filenames with this many descriptive words are enough for a text-only alt
+DESCRIPTIVE_WORDS_MIN = 3
+# Context below this many words cannot explain a photo - vision describes it in detail (approach 1)
+THIN_CONTEXT_WORDS = 30
+
+def text_words(text):
+    """Lowercase words of free text (e.g. an existing alt)"""
+    return [word.lower() for word in WORD_PATTERN.findall(str(text or ''))]
+
+def filename_words(img_url):
+    """Words of the image filename without the extension and WordPress size suffixes"""
+    path = unquote(urlparse(str(img_url)).path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    stem = WORDPRESS_SUFFIX_PATTERN.sub('', stem)
+    return text_words(stem)
+
+def descriptive_words(words):
+    """Filename words that say something about the content (no camera prefixes, size words, hashes)"""
+    return [word for word in words
+            if len(word) >= 3 and word not in GENERIC_WORDS and not re.fullmatch(r'[a-f]{8,}', word)]
+
+def is_template_path(php_file):
+    """True for theme template paths, False for post URLs and permalinks (/our-new-menu/)"""
+    return not is_absolute_url(php_file) and php_file.lower().endswith(TEMPLATE_EXTENSIONS)
+
+def classify_image(img_url, php_file='', context='', current_alt=''):
+    """Returns (approach, reason) for one image"""
+    url = str(img_url or '')
+    path = unquote(urlparse(url).path).lower()
+    words = filename_words(url)
+    word_set = set(words)
+
+    if word_set & DECORATIVE_WORDS:
+        return 3, 'decorative filename'
+    if path.endswith(ICON_EXTENSIONS) or word_set & ICON_WORDS or ICON_PATH_PATTERN.search(path):
+        return 3, 'logo/icon'
+    # Post URLs (scanned exports) are content - only template paths can be chrome
+    php_file = str(php_file or '')
+    if is_template_path(php_file) and CHROME_TEMPLATE_PATTERN.search(php_file):
+        return 3, 'template chrome (header/footer/navigation)'
+    if len(descriptive_words(words)) >= DESCRIPTIVE_WORDS_MIN:
+        return 3, 'descriptive filename'
+    if isinstance(current_alt, str) and len(descriptive_words(text_words(current_alt))) >= DESCRIPTIVE_WORDS_MIN:
+        return 3, 'existing alt text'
+
+    # Content image without a usable name - the model has to look at it
+    if len(str(context or '').split()) < THIN_CONTEXT_WORDS:
+        return 1, 'content image, thin context'
+    return 2, 'content image'
+
+def route_images(df, post_contexts=None, get_context=None):
+    """Adds ai_route (approach) and ai_route_reason columns, returns df"""
+    approaches = []
+    reasons = []
+    for row in df.to_dict('records'):
+        context = get_context(row, post_contexts) if get_context is not None else row.get('line_context', '')
+        approach, reason = classify_image(row.get('src_absolute_url', ''), row.get('php_file', ''),
+                                          context, row.get('current_alt', ''))
+        approaches.append(approach)
+        reasons.append(reason)
+    df['ai_route'] = approaches
+    df['ai_route_reason'] = reasons
+    return df
@@ -0,0 +1,148 @@
+"""
+Batch mode - OpenAI Batch API for offline bulk generation
+Requests are written to JSONL files, uploaded and processed by OpenAI within 24 hours
+at half the price of regular requests. Large runs are split into several batches
+(the API takes at most 50,000 requests and 200 MB per input file) and merged again.
+"""
+
+import json
+import os
+import time
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# Batch API limits per input file
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+# Further batches for lines that failed with a transient error (5xx, 429, expired)
+BATCH_RETRIES = 2
+
+def batch_line(custom_id, body):
+    """Batch API input line for one request"""
+    return json.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": body
+    }, ensure_ascii=False) + "\n"
+
+def write_batch_file(path, requests):
+    """Writes (custom_id, request body) pairs as Batch API input lines"""
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in requests:
+            f.write(batch_line(custom_id, body))
+
+def split_batch_lines(requests, max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_BYTES):
+    """Input lines for (custom_id, body) pairs, grouped into files within the request and size limits"""
+    part, size = [], 0
+    for custom_id, body in requests:
+        line = batch_line(custom_id, body)
+        line_bytes = len(line.encode("utf-8"))
+        if part and (len(part) >= max_requests or size + line_bytes > max_bytes):
+            yield part
+            part, size = [], 0
+        part.append(line)
+        size += line_bytes
+    if part:
+        yield part
+
+def submit_batch(client, path, description=""):
+    """Uploads the input file and creates the batch, returns the batch ID"""
+    with open(path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h",
+        metadata={"description": description} if description else None
+    )
+    print(f"Submitted batch {batch.id} ({os.path.basename(path)})")
+    return batch.id
+
+def wait_for_batch(client, batch_id, poll_interval=60):
+    """Polls until the batch reaches a final status, returns the batch"""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        progress = f"{counts.completed + counts.failed}/{counts.total}" if counts else "-"
+        print(f"    Batch {batch_id}: {batch.status} ({progress})")
+        if batch.status in FINISHED_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+def is_retryable_status(status_code):
+    """Batch line errors worth another batch - server errors, rate limits and request-level
+    errors without a response (batch_expired, batch_cancelled)"""
+    return status_code is None or status_code in (408, 429) or status_code >= 500
+
+def read_batch_results(client, batch):
+    """Returns custom_id -> {"content": ..., "usage": ...} or {"error": ..., "retryable": bool}
+
+    Requests missing from both output files (expired or cancelled batches) are not included.
+    """
+    results = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") == 200:
+                results[entry["custom_id"]] = {"content": body["choices"][0]["message"]["content"],
+                                               "usage": body.get("usage")}
+            else:
+                error = entry.get("error") or body.get("error") or {}
+                results[entry["custom_id"]] = {"error": error.get("message") or f"HTTP {response.get('status_code')}",
+                                               "retryable": is_retryable_status(response.get("status_code"))}
+    return results
+
+def _run_batches(client, requests, path, description, poll_interval, max_requests, max_bytes):
+    """One round: submits every part before waiting, so OpenAI works on them in parallel"""
+    parts = list(split_batch_lines(requests, max_requests, max_bytes))
+    root, ext = os.path.splitext(path)
+    batch_ids = []
+    for number, lines in enumerate(parts, 1):
+        part_path = f"{root}_{number}{ext}" if len(parts) > 1 else path
+        with open(part_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        part_description = f"{description} ({number}/{len(parts)})" if description and len(parts) > 1 else description
+        batch_ids.append(submit_batch(client, part_path, part_description))
+
+    results = {}
+    for batch_id in batch_ids:
+        batch = wait_for_batch(client, batch_id, poll_interval)
+        if batch.status != "completed":
+            print(f"WARNING: Batch {batch_id} ended as '{batch.status}' - missing requests are marked as errors")
+        results.update(read_batch_results(client, batch))
+    return results
+
+def run_batch(client, requests, path, description="", poll_interval=60, retries=None, max_requests=None,
+              max_bytes=None):
+    """Writes, submits and waits for the batches of a request list - returns custom_id -> result (see read_batch_results)
+
+    More requests than fit into one input file go out as <path>_1, <path>_2, ... batches.
+    Lines that failed with a transient error or are missing from the output are sent again
+    in up to `retries` further rounds (<path>_retry1, ...). Defaults: BATCH_RETRIES,
+    MAX_BATCH_REQUESTS and MAX_BATCH_BYTES.
+    """
+    retries = BATCH_RETRIES if retries is None else retries
+    max_requests = max_requests or MAX_BATCH_REQUESTS
+    max_bytes = max_bytes or MAX_BATCH_BYTES
+    root, ext = os.path.splitext(path)
+    results = {}
+    pending = list(requests)
+    for attempt in range(retries + 1):
+        if attempt:
+            print(f"Retrying {len(pending)} failed batch requests")
+        round_path = f"{root}_retry{attempt}{ext}" if attempt else path
+        results.update(_run_batches(client, pending, round_path, description, poll_interval, max_requests, max_bytes))
+        pending = [(custom_id, body) for custom_id, body in pending
+                   if results.get(custom_id, {"retryable": True}).get("retryable")]
+        if not pending:
+            break
+    return results
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Benchmarks - synthetic WordPress corpus for timing the analyzer, a stub OpenAI server for the generator
+Nothing here needs a real export or an API key - numbers are comparable between runs (fixed seeds).
+
+Run: python benchmark.py [wp_posts_export.json] [--posts 500] [--images 2000] [--latency 0.2] [--json results.json]
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+
+import wordpress_image_analyzer as analyzer
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud").split()
+
+def make_paragraph(rng, words=200):
+    """Random filler paragraph"""
+    return '<p>' + ' '.join(rng.choice(WORDS) for _ in range(words)) + '</p>'
+
+def make_gallery_post(post_id, num_images, rng, words_per_image=200):
+    """Gallery-heavy post - every image comes with its own paragraph, so the body grows with image count"""
+    parts = []
+    for i in range(num_images):
+        parts.append(make_paragraph(rng, words_per_image))
+        parts.append(f'<img class="wp-image-{post_id}{i}" src="https://example.com/wp-content/uploads/gallery-{post_id}-{i}.jpg" alt="">')
+    return {
+        'ID': str(post_id),
+        'post_title': f'Gallery {post_id}',
+        'post_name': f'gallery-{post_id}',
+        'post_type': 'post',
+        'post_status': 'publish',
+        'post_content': '\n'.join(parts),
+    }
+
+def make_mixed_post(post_id, rng, num_images=8, words_per_image=120):
+    """Post body mixing the markup real sites produce - Gutenberg blocks, classic [caption], lazy-load attributes"""
+    parts = [f'<!-- wp:heading --><h2>Section {post_id}</h2><!-- /wp:heading -->']
+    for i in range(num_images):
+        url = f'https://example.com/wp-content/uploads/2024/05/photo-{post_id}-{i}-1024x683.jpg'
+        kind = i % 4
+        if kind == 0:
+            parts.append(
+                f'<!-- wp:image {{"id":{post_id * 100 + i},"sizeSlug":"large","linkDestination":"none"}} -->'
+                f'<figure class="wp-block-image size-large"><img src="{url}" alt="" class="wp-image-{post_id * 100 + i}"/>'
+                f'<figcaption class="wp-element-caption">Caption {i}</figcaption></figure><!-- /wp:image -->'
+            )
+        elif kind == 1:
+            parts.append(
+                f'[caption id="attachment_{i}" align="aligncenter" width="300"]<img class="size-medium" '
+                f'src="{url}" alt="Photo {i}" width="300" height="200" /> Caption {i}[/caption]'
+            )
+        elif kind == 2:
+            parts.append(
+                f'<img src="data:image/svg+xml,%3Csvg%3E%3C/svg%3E" data-src="{url}" '
+                f'data-srcset="{url} 1024w" class="lazyload" alt="">'
+            )
+        else:
+            parts.append(f'<img src={url} alt=Photo width=300>')
+        parts.append(make_paragraph(rng, words_per_image))
+    return {
+        'ID': str(post_id),
+        'post_title': f'Post {post_id}',
+        'post_name': f'post-{post_id}',
+        'post_type': 'post',
+        'post_status': 'publish',
+        'post_content': '\n'.join(parts),
+    }
+
+def make_export(num_posts, images_per_post=8, words_per_image=120, seed=0):
+    """phpMyAdmin JSON export of wp_posts - header, database and table entries as phpMyAdmin writes them"""
+    rng = random.Random(seed)
+    posts = [make_mixed_post(post_id, rng, images_per_post, words_per_image) for post_id in range(1, num_posts + 1)]
+    return [
+        {'type': 'header', 'version': '5.2.1', 'comment': 'Export to JSON plugin for PHPMyAdmin'},
+        {'type': 'database', 'name': 'wordpress'},
+        {'type': 'table', 'name': 'wp_posts', 'database': 'wordpress', 'data': posts},
+    ]
+
+def write_export(path, num_posts, images_per_post=8, words_per_image=120, seed=0):
+    """Writes a synthetic export to path, returns its size in bytes"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(make_export(num_posts, images_per_post, words_per_image, seed), f)
+    return os.path.getsize(path)
+
+def make_generation_rows(num_images, unique_share=0.7, seed=0):
+    """Image rows as the analyzer writes them - a share of the images repeats across posts (logos, reused photos)"""
+    rng = random.Random(seed)
+    unique = max(1, int(num_images * unique_share))
+    rows = []
+    for i in range(num_images):
+        image = i if i < unique else rng.randrange(unique)
+        rows.append({
+            'src_absolute_url': f'https://example.com/wp-content/uploads/2024/05/photo-{image}-1024x683.jpg',
+            'php_file': f'https://example.com/post-{i // 8}/',
+            'line_context': ' '.join(rng.choice(WORDS) for _ in range(60)),
+            'current_alt': '',
+        })
+    return rows
+
+def _legacy_extract_images(post_content):
+    """Previous regex cascade - one uncompiled re.search per attribute (baseline only)"""
+    images = []
+    for match in re.finditer(r'<img[^>]*>', post_content, re.IGNORECASE):
+        img_tag = match.group(0)
+        src_match = re.search(r'src=["\']([^"\']+)["\']', img_tag, re.IGNORECASE)
+        if not src_match:
+            continue
+        alt_match = re.search(r'alt=["\']([^"\']*)["\']', img_tag, re.IGNORECASE)
+        images.append((src_match.group(1), alt_match.group(1) if alt_match else ''))
+    return images
+
+def _tokenizer_extract_images(post_content):
+    """Current single-pass tokenizer, reduced to the same (src, alt) output"""
+    images = []
+    for image in analyzer.tokenize_post(post_content)[0]:
+        src, _ = analyzer.resolve_image_src(image['attrs'])
+        if src:
+            images.append((src, image['attrs'].get('alt', '')))
+    return images
+
+def _legacy_find_all_images(posts, base_url=''):
+    """Previous per-image loop - cleans the whole post body again for every <img> (baseline only)"""
+    all_images = []
+    for post in posts:
+        post_content = post.get('post_content', '')
+        for match in re.finditer(r'<img[^>]*>', post_content, re.IGNORECASE):
+            img_tag = match.group(0)
+            src_match = re.search(r'src=["\']([^"\']+)["\']', img_tag, re.IGNORECASE)
+            if not src_match:
+                continue
+            clean_content = re.sub(r'<[^>]+>', ' ', post_content)
+            clean_content = re.sub(r'\s+', ' ', clean_content).strip()
+            all_images.append({
+                'post_url': analyzer.construct_post_url(post, base_url),
+                'img_src': src_match.group(1),
+                'context': clean_content,
+            })
+    return all_images
+
+def _timed(func, *args):
+    """Runs func with stdout silenced, returns (seconds, result)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(*args)
+        return time.perf_counter() - start, result
+
+def _measured(func, *args, **kwargs):
+    """Runs func with stdout silenced under tracemalloc, returns (seconds, peak MB, result)
+
+    The peak is Python heap allocations during the call - tracemalloc slows the call down,
+    so compare seconds only between runs of this benchmark.
+    """
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, result
+
+def benchmark_gallery_scan(image_counts=(25, 50, 100, 200), seed=0):
+    """Per-post cleanup vs per-image cleanup on gallery posts of growing size"""
+    print("GALLERY SCAN (one post, body grows with image count)")
+    print(f"  {'images':>7} {'body KB':>8} {'legacy s':>9} {'current s':>10} {'speedup':>8}")
+
+    previous = None
+    for count in image_counts:
+        rng = random.Random(seed)
+        posts = [make_gallery_post(1, count, rng)]
+        body_kb = len(posts[0]['post_content']) / 1024
+
+        legacy_time, _ = _timed(_legacy_find_all_images, posts)
+        current_time, _ = _timed(analyzer.find_all_images, posts, '', {})
+
+        print(f"  {count:>7} {body_kb:>8.0f} {legacy_time:>9.3f} {current_time:>10.4f} {legacy_time / current_time:>7.0f}x")
+        if previous:
+            scale = count / previous[0]
+            print(f"          x{scale:.0f} images -> legacy x{legacy_time / previous[1]:.1f}, current x{current_time / previous[2]:.1f}")
+        previous = (count, legacy_time, current_time)
+
+def benchmark_tokenizer(posts, rounds=5):
+    """Regex cascade vs single-pass tokenizer on the same post bodies"""
+    bodies = [post.get('post_content', '') for post in posts if post.get('post_content')]
+    total_kb = sum(len(body) for body in bodies) / 1024
+    print(f"\nTOKENIZER ({len(bodies)} posts, {total_kb:.0f} KB, best of {rounds})")
+    print(f"  {'path':<12} {'seconds':>9} {'MB/s':>7} {'images':>7} {'lazy/data: src':>15}")
+
+    for name, extract in (('regex', _legacy_extract_images), ('tokenizer', _tokenizer_extract_images)):
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            found = [extract(body) for body in bodies]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        images = [image for post_images in found for image in post_images]
+        placeholders = sum(1 for src, _ in images if src.startswith('data:'))
+        print(f"  {name:<12} {best:>9.4f} {total_kb / 1024 / best:>7.1f} {len(images):>7} {placeholders:>15}")
+
+def benchmark_analyzer_pipeline(num_posts=500, images_per_post=8, words_per_image=120, export_path=None):
+    """load_wp_posts -> find_all_images -> save_to_excel on a synthetic (or given) export"""
+    with tempfile.TemporaryDirectory() as tmp:
+        if export_path is None:
+            export_path = os.path.join(tmp, 'wp_posts.json')
+            write_export(export_path, num_posts, images_per_post, words_per_image)
+        export_mb = os.path.getsize(export_path) / 1024 / 1024
+
+        load_time, load_peak, posts = _measured(lambda: list(analyzer.load_wp_posts(export_path)))
+        post_table = {}
+        scan_time, scan_peak, images = _measured(analyzer.find_all_images, posts, 'https://example.com', post_table)
+        save_time, save_peak, _ = _measured(analyzer.save_to_excel, images, os.path.join(tmp, 'images.xlsx'),
+                                            post_table.values())
+
+    print(f"\nANALYZER PIPELINE ({len(posts)} posts, {len(images)} images, export {export_mb:.1f} MB)")
+    print(f"  {'stage':<16} {'seconds':>9} {'peak MB':>8} {'throughput':>18}")
+    print(f"  {'load_wp_posts':<16} {load_time:>9.3f} {load_peak:>8.1f} {export_mb / load_time:>13.1f} MB/s")
+    print(f"  {'find_all_images':<16} {scan_time:>9.3f} {scan_peak:>8.1f} {len(images) / scan_time:>9.0f} images/s")
+    print(f"  {'save_to_excel':<16} {save_time:>9.3f} {save_peak:>8.1f} {len(images) / save_time:>9.0f} images/s")
+    return {
+        'posts': len(posts), 'images': len(images), 'export_mb': export_mb,
+        'load_seconds': load_time, 'load_peak_mb': load_peak,
+        'scan_seconds': scan_time, 'scan_peak_mb': scan_peak, 'scan_images_per_second': len(images) / scan_time,
+        'save_seconds': save_time, 'save_peak_mb': save_peak,
+    }
+
+def benchmark_generation(num_images=2000, approach=3, concurrency=20, pack_size=1, latency=0.2, jitter=0.1,
+                         error_rate=0.0, rate_limit_rate=0.0, seed=0):
+    """generate_alt_texts_multi_approach against the stub OpenAI server - same client stack as a real run"""
+    # The generator needs openai (and its own dependencies) - only this benchmark imports it
+    import pandas as pd
+    from openai import AsyncOpenAI
+
+    import multi_approach_alt_generator as generator
+    from openai_stub_server import StubOpenAIServer
+    from rate_limiter import RateLimitedClient, RateLimiter
+    from resilience import CircuitBreaker, ResilientClient
+    from run_metrics import MeteredClient, RunMetrics
+
+    df = pd.DataFrame(make_generation_rows(num_images, seed=seed))
+    # No tier limits here - the stub's own 429s exercise the limiter
+    unlimited = {"rpm": 1_000_000, "tpm": 1_000_000_000}
+    limiter = RateLimiter({"gpt-4o": unlimited, "gpt-4o-mini": unlimited})
+    metrics = RunMetrics()
+
+    with StubOpenAIServer(latency=latency, jitter=jitter, error_rate=error_rate, rate_limit_rate=rate_limit_rate,
+                          seed=seed) as server:
+        breaker = CircuitBreaker(generator.CIRCUIT_FAILURE_THRESHOLD, 1.0)
+        client = ResilientClient(
+            RateLimitedClient(MeteredClient(AsyncOpenAI(api_key="stub", base_url=server.base_url, max_retries=0),
+                                            metrics), limiter, max_retries=0),
+            breaker, max_retries=6, timeout=30, backoff_base=0.05, backoff_cap=1.0
+        )
+        elapsed, peak, df = _measured(generator.generate_alt_texts_multi_approach, df, client, approach, 0, None,
+                                      concurrency, pack_size=pack_size, metrics=metrics)
+        server_stats = dict(server.state.stats)
+
+    metrics.finish()
+    totals = metrics.report()['totals']
+    successful = int(df['ai_analysis_status'].isin(['success', 'decorative']).sum())
+    result = {
+        'images': num_images, 'approach': approach, 'concurrency': concurrency, 'pack_size': pack_size,
+        'latency': latency, 'error_rate': error_rate, 'rate_limit_rate': rate_limit_rate,
+        'seconds': elapsed, 'images_per_second': num_images / elapsed, 'peak_mb': peak,
+        'successful': successful, 'requests': totals['requests'], 'retries': client.stats['retries'],
+        'injected_errors': server_stats['errors'], 'injected_rate_limits': server_stats['rate_limited'],
+        'latency_p50': totals['latency_p50'], 'latency_p95': totals['latency_p95'],
+        'cost_per_1k_images': totals['cost_usd'] / num_images * 1000,
+    }
+
+    print(f"\nGENERATION (approach {approach}, {num_images} images, concurrency {concurrency}, pack size {pack_size}, "
+          f"stub latency {latency}s +{jitter}s, {error_rate:.0%} errors, {rate_limit_rate:.0%} rate limits)")
+    print(f"  {'seconds':>9} {'images/s':>9} {'peak MB':>8} {'ok':>6} {'requests':>9} {'retries':>8} "
+          f"{'p50 s':>6} {'p95 s':>6} {'$/1k images':>12}")
+    print(f"  {elapsed:>9.2f} {result['images_per_second']:>9.1f} {peak:>8.1f} {successful:>6} {totals['requests']:>9} "
+          f"{client.stats['retries']:>8} {totals['latency_p50'] or 0:>6.2f} {totals['latency_p95'] or 0:>6.2f} "
+          f"{result['cost_per_1k_images']:>12.4f}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyzer and generator benchmarks")
+    parser.add_argument('export', nargs='?', help="phpMyAdmin export of wp_posts (default: synthetic corpus)")
+    parser.add_argument('--posts', type=int, default=500, help="synthetic posts")
+    parser.add_argument('--images-per-post', type=int, default=8)
+    parser.add_argument('--words', type=int, default=120, help="words of text per image")
+    parser.add_argument('--images', type=int, default=2000, help="images for the generation benchmark")
+    parser.add_argument('--approach', type=int, default=3, choices=(1, 2, 3))
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--pack-size', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.2, help="stub API latency (seconds)")
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--skip-generation', action='store_true', help="analyzer benchmarks only")
+    parser.add_argument('--json', help="write the results to this file (compare between runs)")
+    args = parser.parse_args()
+
+    results = {}
+    benchmark_gallery_scan()
+
+    if args.export:
+        # Real-world post bodies from a phpMyAdmin export
+        posts = list(itertools.islice(analyzer.load_wp_posts(args.export), 5000))
+    else:
+        rng = random.Random(0)
+        posts = [make_mixed_post(post_id, rng) for post_id in range(1, 501)]
+    benchmark_tokenizer(posts)
+
+    results['analyzer'] = benchmark_analyzer_pipeline(args.posts, args.images_per_post, args.words, args.export)
+    if not args.skip_generation:
+        results['generation'] = benchmark_generation(args.images, args.approach, args.concurrency, args.pack_size,
+                                                     args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Generation journal - append-only JSONL log of per-request results for crash-safe resume
+"""
+
+import hashlib
+import json
+import os
+
+def work_item_key(approach, key):
+    """Stable ID of one work item - approach plus the (image, file, context, current alt) tuple"""
+    return hashlib.sha256(json.dumps([approach, *key], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def journal_path(input_file, approach):
+    """Journal next to the input file, one per input and approach"""
+    return f"{os.path.splitext(input_file)[0]}_approach_{approach}.journal.jsonl"
+
+class GenerationJournal:
+    """Appends one line per finished request and flushes it to disk before moving on
+
+    A crash loses at most the requests in flight. With resume=True the existing
+    journal is replayed: successful results are applied without calling the API
+    again, errors are retried. Without resume the journal starts empty - the file is
+    only opened (and truncated) when the first result is recorded.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.resume = resume
+        self.results = {}
+        self.file = None
+        if resume and os.path.exists(path):
+            self._replay()
+
+    def _replay(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line cut short by the crash
+                    continue
+                if entry["result"].get("success"):
+                    self.results[entry["key"]] = entry["result"]
+                else:
+                    self.results.pop(entry["key"], None)
+
+    def get(self, key):
+        """Successful result recorded by an earlier run, or None"""
+        return self.results.get(key)
+
+    def record(self, key, result):
+        if self.file is None:
+            self.file = open(self.path, "a" if self.resume else "w", encoding="utf-8")
+        self.file.write(json.dumps({"key": key, "result": result}, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if result.get("success"):
+            self.results[key] = result
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
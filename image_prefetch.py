@@ -0,0 +1,264 @@
+"""
+Image prefetch - downloads, downscales and inlines images for the vision approaches
+OpenAI no longer fetches full-size originals from the site: images are downloaded once over a
+pooled connection, resized to the configured detail level, cached on disk and sent as
+base64 data URLs. Requires Pillow and httpx (pip install Pillow httpx).
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import posixpath
+from urllib.parse import unquote, urlparse
+
+from approach_router import WORDPRESS_SUFFIX_PATTERN
+from run_metrics import log
+
+# Vision input sizes - low detail is one 512px tile (85 tokens), high detail is scaled
+# to fit 2048x2048 and then to 768px on the short side before tiling
+LOW_DETAIL_SIZE = 512
+HIGH_DETAIL_MAX_SIZE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+
+# Larger downloads are not inlined - the original URL is sent instead
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+def target_size(width, height, max_detail="high"):
+    """Returns ((width, height), detail) - images that fit into one low-detail tile are sent as low"""
+    if max_detail == "low" or max(width, height) <= LOW_DETAIL_SIZE:
+        scale = min(1.0, LOW_DETAIL_SIZE / max(width, height))
+        detail = "low"
+    else:
+        scale = min(1.0, HIGH_DETAIL_MAX_SIZE / max(width, height), HIGH_DETAIL_SHORT_SIDE / min(width, height))
+        detail = "high"
+    return (max(1, round(width * scale)), max(1, round(height * scale))), detail
+
+def dhash(image, size=8):
+    """Difference hash of a PIL image - 64 bits as hex, robust to resizing and recompression"""
+    from PIL import Image
+
+    gray = image.convert('L').resize((size + 1, size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            offset = row * (size + 1) + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return f"{bits:0{size * size // 4}x}"
+
+def encode_image(data, max_detail="high"):
+    """Resizes raw image bytes, returns {"url": data URL, "detail": low/high, "hash": dHash}
+
+    Images with transparency stay PNG (logos, icons), everything else becomes JPEG.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image_hash = dhash(image)
+        size, detail = target_size(image.width, image.height, max_detail)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+
+        output = io.BytesIO()
+        if has_alpha:
+            image.save(output, format='PNG', optimize=True)
+            mime = 'image/png'
+        else:
+            image.save(output, format='JPEG', quality=85, optimize=True)
+            mime = 'image/jpeg'
+    encoded = base64.b64encode(output.getvalue()).decode('ascii')
+    return {"url": f"data:{mime};base64,{encoded}", "detail": detail, "hash": image_hash}
+
+class ImagePrefetcher:
+    """Fetches images for the vision approaches with bounded concurrency and an on-disk cache
+
+    fetch() returns {"url": ..., "detail": ..., "hash": ...} - url and detail form the image_url
+    part of a vision message, hash is the perceptual hash used by ImageClusters. Images that cannot be downloaded or decoded (SVG, 404, timeouts) fall back to the
+    original URL with detail "auto", so OpenAI fetches them as before.
+    """
+
+    def __init__(self, cache_dir="image_cache", max_detail="high", concurrency=8, timeout=30):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise ImportError("Image prefetch requires Pillow: pip install Pillow")
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            raise ImportError("Image prefetch requires httpx: pip install httpx")
+        if max_detail not in ("low", "high"):
+            raise ValueError(f"Unknown image detail: {max_detail} (use 'low' or 'high')")
+        self.cache_dir = cache_dir
+        self.max_detail = max_detail
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.client = None
+        self.semaphore = None
+        self.pending = {}
+        self.failed_urls = set()
+        self.stats = {'downloaded': 0, 'cached': 0, 'failed': 0, 'bytes_downloaded': 0, 'bytes_sent': 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, img_url):
+        digest = hashlib.sha256(f"{self.max_detail}|{img_url}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _read_cache(self, img_url):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(img_url), encoding='utf-8') as f:
+                image = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Entries written before perceptual hashing are fetched again
+        return image if 'hash' in image else None
+
+    def _write_cache(self, img_url, image):
+        if not self.cache_dir:
+            return
+        path = self._cache_path(img_url)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(image, f)
+        os.replace(path + '.tmp', path)
+
+    async def fetch(self, img_url):
+        """Inlined image for img_url - concurrent calls for the same URL share one download"""
+        task = self.pending.get(img_url)
+        if task is None:
+            task = self.pending[img_url] = asyncio.ensure_future(self._fetch(img_url))
+            task.add_done_callback(lambda _: self.pending.pop(img_url, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, img_url):
+        # Failures are remembered for this run only - the next run tries again
+        if img_url in self.failed_urls:
+            return {"url": img_url, "detail": "auto", "hash": None}
+        image = self._read_cache(img_url)
+        if image is not None:
+            self.stats['cached'] += 1
+            return image
+
+        if self.client is None:
+            import httpx
+
+            # One pooled client per event loop run - connections are reused across images
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            )
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        try:
+            async with self.semaphore:
+                response = await self.client.get(img_url)
+                response.raise_for_status()
+                data = response.content
+            if len(data) > MAX_IMAGE_BYTES:
+                raise ValueError(f"image larger than {MAX_IMAGE_BYTES // (1024 * 1024)} MB")
+            # Decoding and resizing is CPU work - keep it off the event loop
+            image = await asyncio.to_thread(encode_image, data, self.max_detail)
+        except Exception as e:
+            log(f"    Prefetch failed, sending original URL ({type(e).__name__}: {e})")
+            self.stats['failed'] += 1
+            self.failed_urls.add(img_url)
+            return {"url": img_url, "detail": "auto", "hash": None}
+
+        self.stats['downloaded'] += 1
+        self.stats['bytes_downloaded'] += len(data)
+        self.stats['bytes_sent'] += len(image['url'])
+        self._write_cache(img_url, image)
+        return image
+
+    async def close(self):
+        """Closes the pooled connections (a later fetch opens a new pool)"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+def image_stem_key(img_url):
+    """Host, folder and filename stem without extension and WordPress size suffixes -
+    the same for photo.jpg, photo-300x200.jpg and photo-scaled.webp in one uploads folder"""
+    parsed = urlparse(str(img_url))
+    path = unquote(parsed.path)
+    stem = posixpath.splitext(posixpath.basename(path))[0]
+    return parsed.netloc.lower(), posixpath.dirname(path), WORDPRESS_SUFFIX_PATTERN.sub('', stem).lower()
+
+class ImageClusters:
+    """Clusters near-duplicate images - WordPress size variants (-300x200, -scaled) and the
+    same photo re-uploaded under another name
+
+    Size variants are grouped by name first (image_stem_key), without looking at the pixels.
+    Other images join by perceptual hash: hashes that differ in at most max_distance bits
+    share a cluster, represented by the first image seen. The 64-bit hash is split into
+    max_distance + 1 bands: near duplicates match exactly in at least one band, so candidates
+    come from a band index instead of a scan over all clusters.
+    """
+
+    def __init__(self, max_distance=4, bits=64):
+        self.max_distance = max_distance
+        # (shift, width) of each band - the last band takes the remaining bits
+        width = bits // (max_distance + 1)
+        self.bands = []
+        for i in range(max_distance + 1):
+            shift = i * width
+            self.bands.append((shift, width if i < max_distance else bits - shift))
+        self.index = [{} for _ in self.bands]
+        self.representatives = {}
+        self.stems = {}
+        self.tasks = {}
+        self.stats = {'images': 0, 'clusters': 0, 'by_name': 0, 'shared': 0}
+
+    def match(self, img_url):
+        """Representative known without the image - assigned before or a size variant of a
+        clustered image - or None when the hash is needed"""
+        if img_url in self.representatives:
+            return self.representatives[img_url]
+        return self.stems.get(image_stem_key(img_url))
+
+    def assign(self, img_url, image_hash=None):
+        """Returns the cluster representative for the image (itself for the first of its cluster)"""
+        if img_url in self.representatives:
+            return self.representatives[img_url]
+        self.stats['images'] += 1
+
+        stem_key = image_stem_key(img_url)
+        representative = self.stems.get(stem_key)
+        if representative is not None:
+            self.stats['by_name'] += 1
+        elif image_hash is not None:
+            value = int(image_hash, 16)
+            keys = [(value >> shift) & ((1 << width) - 1) for shift, width in self.bands]
+            for band, key in zip(self.index, keys):
+                for candidate, candidate_url in band.get(key, ()):
+                    if bin(value ^ candidate).count('1') <= self.max_distance:
+                        representative = candidate_url
+                        break
+                if representative is not None:
+                    break
+            if representative is None:
+                for band, key in zip(self.index, keys):
+                    band.setdefault(key, []).append((value, img_url))
+
+        if representative is None:
+            representative = img_url
+            self.stats['clusters'] += 1
+        self.representatives[img_url] = representative
+        self.stems.setdefault(stem_key, representative)
+        return representative
+
+    async def once(self, key, factory):
+        """Runs factory() once per key - concurrent and later callers get the same result"""
+        task = self.tasks.get(key)
+        if task is None:
+            task = self.tasks[key] = asyncio.ensure_future(factory())
+        else:
+            self.stats['shared'] += 1
+        return await asyncio.shield(task)
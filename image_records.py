@@ -0,0 +1,57 @@
+"""
+Image records - the one row schema shared by the analyzer and the generator
+The analyzer emits img_src / post_url / context, the generator works on
+src_absolute_url / php_file / line_context. Records are mapped once, the analyzer
+columns are kept, so results can be traced back to the post and the tag.
+"""
+
+from urllib.parse import urljoin, urlparse
+
+# Analyzer column -> generator column
+GENERATION_COLUMNS = {
+    'img_src': 'src_absolute_url',
+    'post_url': 'php_file',
+    'context': 'line_context',
+}
+
+def is_absolute_url(url):
+    return urlparse(url).scheme in ('http', 'https')
+
+def resolve_image_url(src, page_url='', base_url=''):
+    """Absolute URL of an <img> src - relative to the post URL, or to the site URL if that is not absolute
+
+    Protocol-relative sources (//cdn.example.com/...) get the scheme of the site (https if unknown),
+    data: URIs and sources that cannot be resolved are returned unchanged.
+    """
+    src = str(src or '').strip()
+    if not src or src.startswith('data:') or is_absolute_url(src):
+        return src
+    if src.startswith('//'):
+        scheme = urlparse(page_url).scheme or urlparse(base_url).scheme or 'https'
+        return f"{scheme}:{src}"
+    if page_url and is_absolute_url(page_url):
+        return urljoin(page_url, src)
+    if base_url and is_absolute_url(base_url):
+        return urljoin(base_url.rstrip('/') + '/', src)
+    return src
+
+def to_generation_record(image, base_url=''):
+    """Image dict from the analyzer -> row the generator can process (columns already present are kept)"""
+    record = dict(image)
+    if 'src_absolute_url' not in record:
+        record['src_absolute_url'] = resolve_image_url(image.get('img_src'), image.get('post_url', ''), base_url)
+    record.setdefault('php_file', image.get('post_url', ''))
+    record.setdefault('line_context', image.get('context', ''))
+    record.setdefault('current_alt', '')
+    return record
+
+def to_generation_frame(df, base_url=''):
+    """Same mapping for a table read back from the analyzer's output - returns df with the generator columns"""
+    if 'src_absolute_url' not in df.columns and 'img_src' in df.columns:
+        page_urls = df['post_url'] if 'post_url' in df.columns else [''] * len(df)
+        df['src_absolute_url'] = [resolve_image_url(src, page_url if isinstance(page_url, str) else '', base_url)
+                                  for src, page_url in zip(df['img_src'], page_urls)]
+    for source, target in GENERATION_COLUMNS.items():
+        if target not in df.columns and source in df.columns:
+            df[target] = df[source]
+    return df
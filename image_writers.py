@@ -0,0 +1,105 @@
+"""
+Image report writers - streaming CSV / JSONL / Parquet output
+Rows are written as the scan produces them, so memory use does not grow with the export.
+"""
+
+import csv
+import json
+
+class CsvWriter:
+    """Streams dict rows to CSV - columns are fixed by the first row"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.writer = None
+
+    def write_rows(self, rows):
+        for row in rows:
+            if self.writer is None:
+                self.file = open(self.path, 'w', encoding='utf-8', newline='')
+                self.writer = csv.DictWriter(self.file, fieldnames=list(row), extrasaction='ignore')
+                self.writer.writeheader()
+            self.writer.writerow(row)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+class JsonlWriter:
+    """Streams dict rows to JSON Lines - one object per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """Writes dict rows to Parquet in row groups of batch_size (requires pyarrow)"""
+
+    def __init__(self, path, batch_size=10000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.batch_size = batch_size
+        self.buffer = []
+        self.schema = None
+        self.writer = None
+
+    def write_rows(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        # Schema comes from the first batch - later batches are cast to it
+        table = self.pa.Table.from_pylist(self.buffer, schema=self.schema)
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table)
+        self.buffer = []
+
+    def close(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+
+WRITERS = {
+    'csv': CsvWriter,
+    'jsonl': JsonlWriter,
+    'parquet': ParquetWriter
+}
+
+class ImageReportWriter:
+    """Images and posts tables in one streaming format: <base>.<fmt> and <base>_posts.<fmt>"""
+
+    def __init__(self, base_path, fmt):
+        if fmt not in WRITERS:
+            raise ValueError(f"Unknown output format: {fmt} (available: {', '.join(WRITERS)})")
+        self.paths = [f"{base_path}.{fmt}", f"{base_path}_posts.{fmt}"]
+        self.images = WRITERS[fmt](self.paths[0])
+        self.posts = WRITERS[fmt](self.paths[1])
+
+    def write(self, images, post_row=None):
+        """Writes image rows of one post and its post table entry"""
+        self.images.write_rows(images)
+        if post_row is not None:
+            self.posts.write_rows([post_row])
+
+    def close(self):
+        self.images.close()
+        self.posts.close()
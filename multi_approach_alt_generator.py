@@ -4,108 +4,135 @@ Alt Text Generator - All Approaches
 1. Two-step: Vision API → description → Text LLM → alt text
 2. One-step (vision): Vision API + context → alt text
 3. One-step (text): Only URL + context → alt text
+
+Run: python multi_approach_alt_generator.py [--resume]
+--resume replays the journal of an interrupted run and skips the images it finished
 """
 
 import pandas as pd
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+import asyncio
+import contextlib
+import json
+import os
+import sys
 import time
 from datetime import datetime
 
+from alt_text_cache import AltTextCache
+from approach_router import route_images
+from batch_mode import run_batch
+from generation_journal import GenerationJournal, journal_path, work_item_key
+from image_records import to_generation_frame
+from image_prefetch import ImageClusters, ImagePrefetcher
+from prompt_templates import (APPROACH_TEMPLATES, DESCRIPTION, PACKED_ITEM, PACKED_TEXT_ONLY, prompt_version,
+                              template_name)
+from rate_limiter import RateLimitedClient, RateLimiter
+from resilience import CircuitBreaker, ResilientClient
+from run_metrics import ESTIMATED_COMPLETION_TOKENS, MeteredClient, ProgressLine, RunMetrics, estimate_request_cost, log
+
 # SET YOUR API KEY
 OPENAI_API_KEY = "sk-your-api-key-here"  # CHANGE THIS!
 
-def approach_1_two_step(client, img_url, php_file, context, current_alt, delay=1.0):
+# Requests/tokens per minute for your OpenAI usage tier (see platform.openai.com/settings/organization/limits)
+RATE_LIMITS = {
+    "gpt-4o-mini": {"rpm": 500, "tpm": 200000},  # Approach 1, step 1
+    "gpt-4o": {"rpm": 500, "tpm": 30000}         # Everything else
+}
+
+# Transient API errors (429, 5xx, timeouts) are retried with jittered exponential backoff.
+# REQUEST_TIMEOUT: seconds per attempt. After CIRCUIT_FAILURE_THRESHOLD transient failures in a row
+# dispatch pauses for CIRCUIT_RESET_SECONDS, then one probe request decides whether to resume
+MAX_RETRIES = 4
+REQUEST_TIMEOUT = 60
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30
+
+# Models per step - part of the result cache key
+DESCRIPTION_MODEL = "gpt-4o-mini"
+ALT_TEXT_MODEL = "gpt-4o"
+
+APPROACH_NAMES = {
+    1: "Two-step (Vision + Text)",
+    2: "One-step (Vision)",
+    3: "One-step (Text)",
+    4: "Auto (routed per image)"
+}
+AUTO_APPROACH = 4
+
+# Approach 3: images per request (1 = one request per image) and prompt token budget per packed request
+PACK_SIZE = 10
+PACK_TOKEN_BUDGET = 6000
+PACKED_COMPLETION_TOKENS = 60
+PACKED_MAX_ALT_LENGTH = 250
+
+# Batch API mode - price discount and status polling interval (seconds)
+BATCH_DISCOUNT = 0.5
+BATCH_POLL_INTERVAL = 60
+
+# Seconds between progress line updates (token prices are in run_metrics.PRICES)
+PROGRESS_INTERVAL = 1.0
+
+# Result cache (None disables it)
+CACHE_FILE = "alt_text_cache.sqlite"
+CACHE_MAX_ENTRIES = 200000
+CACHE_MAX_AGE_DAYS = 90
+
+# Image prefetch for the vision approaches (1, 2) - images are downloaded, downscaled and sent inline
+# IMAGE_DETAIL: "high" (up to 768px on the short side) or "low" (512px, cheapest); small images always go as low
+IMAGE_PREFETCH = True
+IMAGE_CACHE_DIR = "image_cache"
+IMAGE_DETAIL = "high"
+PREFETCH_CONCURRENCY = 8
+# Approach 1: near-duplicate images (size variants, re-uploads) share one description - needs IMAGE_PREFETCH
+# CLUSTER_MAX_DISTANCE: differing bits of the 64-bit perceptual hash still counted as the same image
+IMAGE_CLUSTERING = True
+CLUSTER_MAX_DISTANCE = 4
+
+async def approach_1_two_step(client, img_url, php_file, context, current_alt, delay=1.0, cache=None, prefetcher=None,
+                              clusters=None):
     """
     APPROACH 1: Two-step
-    Step 1: Vision API - describe image
+    Step 1: Vision API - describe image (cached per image URL when cache is given,
+            sent inline when an ImagePrefetcher is given, once per cluster of
+            near-duplicate images when ImageClusters is given)
     Step 2: Text LLM - generate alt based on description + context
     """
-    print(f"    [Step 1/2] Analyzing image...")
-
-    # STEP 1: Vision API - image description only
-    try:
-        description_prompt = "What's in this image? Describe what you see in detail. Focus on the main elements, colors, text, people, objects, and overall composition."
-
-        description_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": description_prompt},
-                    {"type": "image_url", "image_url": {"url": img_url}}
-                ]
-            }]
-        )
-
-        image_description = description_response.choices[0].message.content.strip()
-        print(f"    Description: {image_description[:100]}...")
-        
-        time.sleep(delay)
-        
-    except Exception as e:
-        return {"success": False, "error": f"Step 1 error: {str(e)}", "image_description": "", "alt_text": ""}
+    # A cached description needs no download
+    own_key = AltTextCache.description_key(img_url, DESCRIPTION_MODEL, DESCRIPTION.version)
+    image_description = cache.get_description(own_key) if cache is not None else None
     
-    print(f"    [Step 2/2] Generating alt text...")
+    # Near duplicates are described once - under the URL of the cluster's first image.
+    # Size variants of a known image join by name, other images are fetched for their hash.
+    image = None
+    description_url = img_url
+    if image_description is None and clusters is not None and prefetcher is not None:
+        if clusters.match(img_url) is None:
+            image = await prefetcher.fetch(img_url)
+        description_url = clusters.assign(img_url, image["hash"] if image is not None else None)
+        if description_url != img_url and cache is not None:
+            image_description = cache.get_description(
+                AltTextCache.description_key(description_url, DESCRIPTION_MODEL, DESCRIPTION.version))
+    
+    if image_description is None:
+        describe = lambda: _describe_image(client, img_url, delay, prefetcher, image)
+        result = await (clusters.once(description_url, describe) if clusters is not None else describe())
+        if not result["success"]:
+            return result
+        image_description = result["image_description"]
+        if cache is not None:
+            cache.put_description(AltTextCache.description_key(description_url, DESCRIPTION_MODEL, DESCRIPTION.version),
+                                  image_description)
+    # Stored under the image's own URL too - the next run finds it without fetching
+    if cache is not None and description_url != img_url:
+        cache.put_description(own_key, image_description)
     
     # STEP 2: Text LLM - alt text based on description + context
     try:
-        alt_prompt = f"""You are creating an alt text for an image in a WordPress PHP template file.
-
-IMAGE URL: {img_url}
-PHP TEMPLATE FILE: {php_file}
-CURRENT ALT TEXT: "{current_alt}" (empty if none)
-
-DETAILED IMAGE DESCRIPTION:
-{image_description}
-
-CODE CONTEXT around the image tag:
-```php
-{context}
-```
-
-INSTRUCTIONS:
-- Use the detailed image description and code context to create the perfect alt text
-- This image is part of a website template (header, footer, layout elements)
-- Consider if it's a logo, icon, decorative element, or content image
-- **If the image shows a person, try to identify them from the page context (text, names mentioned)**
-- **For people: include their name and title/role if mentioned in the context**
-
-REQUIREMENTS:
-- Maximum 125 characters
-- Be descriptive and helpful for accessibility
-- Don't use words like "image", "picture", "photo"
-- For logos: include company/organization name
-- For icons: describe the function/meaning
-- For people: include name and title if identifiable from context
-- For decorative elements: consider if alt should be empty
-- Be specific and contextual
-
-EXAMPLE: If you see a person and context mentions "Dr. Jane Smith, Professor of Medicine" 
-→ Alt text: "Dr. Jane Smith, Professor of Medicine, in professional portrait"
-
-RESPONSE: Provide only the alt text, nothing else. If the image is purely decorative, respond with "DECORATIVE"."""
-
-        alt_response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": alt_prompt}],
-            temperature=0.3
+        alt_response = await client.chat.completions.create(
+            **build_alt_text_request(1, img_url, php_file, context, current_alt, image_description)
         )
-        
-        alt_text = alt_response.choices[0].message.content.strip().strip('"\'')
-        
-        # Handle decorative images
-        if alt_text == "DECORATIVE":
-            alt_text = ""
-            status = "decorative"
-        else:
-            status = "success"
-        
-        return {
-            "success": True, 
-            "image_description": image_description, 
-            "alt_text": alt_text,
-            "status": status
-        }
+        return parse_alt_text(alt_response.choices[0].message.content, image_description)
         
     except Exception as e:
         return {
@@ -115,227 +142,715 @@ RESPONSE: Provide only the alt text, nothing else. If the image is purely decora
             "alt_text": ""
         }
 
-def approach_2_one_step_vision(client, img_url, php_file, context, current_alt):
+async def _describe_image(client, img_url, delay=1.0, prefetcher=None, image=None):
+    """Approach 1, step 1: Vision API - image description only"""
+    try:
+        if image is None and prefetcher is not None:
+            image = await prefetcher.fetch(img_url)
+        description_response = await client.chat.completions.create(**build_description_request(img_url, image))
+
+        image_description = description_response.choices[0].message.content.strip()
+        
+        if delay:
+            await asyncio.sleep(delay)
+        
+    except Exception as e:
+        return {"success": False, "error": f"Step 1 error: {str(e)}", "image_description": "", "alt_text": ""}
+    
+    return {"success": True, "image_description": image_description}
+
+# image_description stored for the one-step approaches
+ONE_STEP_DESCRIPTIONS = {
+    2: "Generated with vision in one step",
+    3: "Generated from filename/context only"
+}
+
+def _image_part(img_url, image=None):
+    """image_url content part - the inlined image from ImagePrefetcher, or the original URL"""
+    if image is None:
+        return {"url": img_url}
+    return {"url": image["url"], "detail": image["detail"]}
+
+def build_description_request(img_url, image=None):
+    """Chat completion request body for approach 1, step 1
+    image: image_url part from ImagePrefetcher ({"url": data URL, "detail": ...}), default is the original URL
+    """
+    return {
+        "model": DESCRIPTION_MODEL,
+        "messages": DESCRIPTION.messages(image=_image_part(img_url, image))
+    }
+
+def build_alt_text_request(approach, img_url, php_file, context, current_alt, image_description="", image=None):
+    """Chat completion request body producing the alt text (approach 1: step 2, from image_description)"""
+    messages = APPROACH_TEMPLATES[approach].messages(
+        image=_image_part(img_url, image) if approach == 2 else None,
+        img_url=img_url, php_file=php_file, context=context, current_alt=current_alt,
+        image_description=image_description
+    )
+    return {
+        "model": ALT_TEXT_MODEL,
+        "messages": messages,
+        "temperature": 0.3
+    }
+
+def parse_alt_text(content, image_description):
+    """Turns the model's answer into a result dict - DECORATIVE means an empty alt"""
+    alt_text = content.strip().strip('"\'')
+    
+    # Handle decorative images
+    if alt_text == "DECORATIVE":
+        alt_text = ""
+        status = "decorative"
+    else:
+        status = "success"
+    
+    return {
+        "success": True, 
+        "image_description": image_description, 
+        "alt_text": alt_text,
+        "status": status
+    }
+
+async def approach_2_one_step_vision(client, img_url, php_file, context, current_alt, prefetcher=None):
     """
     APPROACH 2: One-step with Vision API
     Vision API + context → alt text in one step
     """
-    print(f"    Analyzing with vision API...")
-    
     try:
-        prompt = f"""You are creating an alt text for an image found in a WordPress PHP template file.
-
-IMAGE URL: {img_url}
-PHP TEMPLATE FILE: {php_file}
-CURRENT ALT TEXT: "{current_alt}" (empty if none)
-
-CODE CONTEXT around the image tag:
-```php
-{context}
-```
-
-INSTRUCTIONS:
-- Look at the image and understand what it shows
-- This image is part of the website template (header, footer, layout elements)
-- Consider if it's a logo, icon, decorative element, or content image
-- The context shows where in the PHP template this image appears
-- **If the image shows a person, try to identify them from the page context (text, names mentioned)**
-- **For people: include their name and title/role if mentioned in the context**
-
-REQUIREMENTS:
-- Maximum 125 characters
-- Be descriptive and helpful for accessibility
-- Don't use words like "image", "picture", "photo"
-- For logos: include company/organization name
-- For icons: describe the function/meaning
-- For people: include name and title if identifiable from context
-- For decorative elements: consider if alt should be empty
-- Be specific and contextual
-
-EXAMPLE: If you see a person and context mentions "Dr. Jane Smith, Professor of Medicine" 
-→ Alt text: "Dr. Jane Smith, Professor of Medicine, in professional portrait"
-
-RESPONSE: Provide only the alt text, nothing else. If the image is purely decorative, respond with "DECORATIVE"."""
-
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": img_url}}
-                ]
-            }],
-            temperature=0.3
+        image = await prefetcher.fetch(img_url) if prefetcher is not None else None
+        response = await client.chat.completions.create(
+            **build_alt_text_request(2, img_url, php_file, context, current_alt, image=image)
         )
-        
-        alt_text = response.choices[0].message.content.strip().strip('"\'')
-        
-        if alt_text == "DECORATIVE":
-            alt_text = ""
-            status = "decorative"
-        else:
-            status = "success"
-        
-        return {
-            "success": True, 
-            "image_description": "Generated with vision in one step", 
-            "alt_text": alt_text,
-            "status": status
-        }
+        return parse_alt_text(response.choices[0].message.content, ONE_STEP_DESCRIPTIONS[2])
         
     except Exception as e:
         return {"success": False, "error": str(e), "image_description": "", "alt_text": ""}
 
-def approach_3_text_only(client, img_url, php_file, context, current_alt):
+async def approach_3_text_only(client, img_url, php_file, context, current_alt):
     """
     APPROACH 3: Text only
     Only URL + context → alt text (no image analysis)
     """
-    print(f"    Generating from context (text-only)...")
-    
     try:
-        prompt = f"""You are creating an alt text for an image found in a WordPress PHP template file.
-
-IMAGE URL: {img_url}
-PHP TEMPLATE FILE: {php_file}
-CURRENT ALT TEXT: "{current_alt}" (empty if none)
-
-CODE CONTEXT around the image tag:
-```php
-{context}
-```
-
-INSTRUCTIONS:
-- Based on the image URL and context, create an appropriate alt text
-- This image is part of the website template (header, footer, layout elements)
-- Consider if it's a logo, icon, decorative element, or content image
-- Look at the filename and path for clues about the image content
-- The context shows where in the PHP template this image appears
-- **If the context suggests the image shows a person, try to identify them from the text**
-- **For people: include their name and title/role if mentioned in the context**
-
-REQUIREMENTS:
-- Maximum 125 characters
-- Be descriptive and helpful for accessibility
-- Don't use words like "image", "picture", "photo"
-- For logos: include company/organization name
-- For icons: describe the function/meaning
-- For people: include name and title if identifiable from context
-- For decorative elements: consider if alt should be empty
-- Be specific and contextual based on filename and context
-
-EXAMPLE: If filename is "dr-smith-portrait.jpg" and context mentions "Dr. Jane Smith, Professor" 
-→ Alt text: "Dr. Jane Smith, Professor of Medicine, in professional portrait"
-
-RESPONSE: Provide only the alt text, nothing else. If the image is purely decorative, respond with "DECORATIVE"."""
-
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
+        response = await client.chat.completions.create(
+            **build_alt_text_request(3, img_url, php_file, context, current_alt)
         )
-        
-        alt_text = response.choices[0].message.content.strip().strip('"\'')
-        
-        if alt_text == "DECORATIVE":
-            alt_text = ""
-            status = "decorative"
-        else:
-            status = "success"
-        
-        return {
-            "success": True, 
-            "image_description": "Generated from filename/context only", 
-            "alt_text": alt_text,
-            "status": status
-        }
+        return parse_alt_text(response.choices[0].message.content, ONE_STEP_DESCRIPTIONS[3])
         
     except Exception as e:
         return {"success": False, "error": str(e), "image_description": "", "alt_text": ""}
 
-def generate_alt_texts_multi_approach(df, client, approach, delay=1.0):
+def _packed_messages(items):
+    """Approach 3 messages for several images at once - instructions are sent once per request"""
+    blocks = [PACKED_ITEM.format(item_id=item_id, img_url=img_url, php_file=php_file, context=context,
+                                 current_alt=current_alt)
+              for item_id, img_url, php_file, context, current_alt in items]
+    return PACKED_TEXT_ONLY.messages(count=len(items), items="\n\n".join(blocks))
+
+def _prompt_tokens(messages):
+    """Prompt token estimate of the text parts (~4 characters per token)"""
+    return sum(len(message["content"]) for message in messages if isinstance(message["content"], str)) // 4
+
+def build_packed_request(items):
+    """Chat completion request body for a packed approach 3 request - JSON output keyed by item id"""
+    return {
+        "model": ALT_TEXT_MODEL,
+        "messages": _packed_messages(items),
+        "temperature": 0.3,
+        "response_format": {"type": "json_object"},
+        "max_tokens": PACKED_COMPLETION_TOKENS * len(items) + 50
+    }
+
+def parse_packed_response(content, item_ids):
+    """Returns item_id -> result for the items answered with a usable alt text (missing/malformed are left out)"""
+    try:
+        answers = json.loads(content)
+    except ValueError:
+        return {}
+    if not isinstance(answers, dict):
+        return {}
+    results = {}
+    for item_id in item_ids:
+        alt_text = answers.get(item_id)
+        if isinstance(alt_text, str) and len(alt_text) <= PACKED_MAX_ALT_LENGTH:
+            results[item_id] = parse_alt_text(alt_text, ONE_STEP_DESCRIPTIONS[3] + " (packed)")
+    return results
+
+def plan_packs(items, max_items=10, token_budget=6000):
+    """Splits approach 3 items into packs of at most max_items whose prompt stays under token_budget
+
+    An item that alone exceeds the budget gets a pack of its own. Tokens are estimated at ~4 characters per token.
     """
-    Generates alt texts using the selected approach
+    base_tokens = _prompt_tokens(_packed_messages([]))
+    packs = []
+    pack = []
+    pack_tokens = base_tokens
+    for item in items:
+        item_tokens = _prompt_tokens(_packed_messages([item])) - base_tokens
+        if pack and (len(pack) >= max_items or pack_tokens + item_tokens > token_budget):
+            packs.append(pack)
+            pack = []
+            pack_tokens = base_tokens
+        pack.append(item)
+        pack_tokens += item_tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+async def approach_3_packed(client, items, max_retries=2):
     """
-    approach_names = {
-        1: "Two-step (Vision + Text)",
-        2: "One-step (Vision)",
-        3: "One-step (Text)"
-    }
+    APPROACH 3, packed: several images per request
+    items: (item_id, img_url, php_file, context, current_alt) tuples
+    Returns item_id -> result. Items missing from the answer or malformed are sent again
+    (only those) up to max_retries times, then reported as errors. A request that fails outright
+    (after the client's own retries) fails all items still pending.
+    """
+    results = {}
+    pending = list(items)
+    error = "missing from packed response"
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.chat.completions.create(**build_packed_request(pending))
+            answered = parse_packed_response(response.choices[0].message.content, [item[0] for item in pending])
+        except Exception as e:
+            # Transient errors were already retried by the client - the whole pack failed
+            error = str(e)
+            break
+        results.update(answered)
+        pending = [item for item in pending if item[0] not in answered]
+        if not pending:
+            break
+        if attempt < max_retries:
+            log(f"    Retrying {len(pending)} of {len(items)} items (missing or malformed)")
     
-    print(f"Generating alt texts - {approach_names[approach]}...")
+    for item in pending:
+        results[item[0]] = {"success": False, "error": error, "image_description": "", "alt_text": ""}
+    return results
+
+# Input formats written by wordpress_image_analyzer.py
+INPUT_FORMATS = ('.xlsx', '.csv', '.jsonl', '.parquet')
+
+def read_table(path, columns=None):
+    """Reads a CSV / JSONL / Parquet table (JSONL is read in chunks, keeping only the requested columns)"""
+    if path.endswith('.csv'):
+        return pd.read_csv(path, usecols=columns)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    if path.endswith('.jsonl'):
+        chunks = pd.read_json(path, lines=True, chunksize=10000, dtype=False)
+        return pd.concat([chunk[columns] if columns else chunk for chunk in chunks], ignore_index=True)
+    raise ValueError(f"Unsupported input format: {path} (use one of {', '.join(INPUT_FORMATS)})")
+
+def posts_table_path(path):
+    """Posts table written next to the images table: wordpress_images.csv -> wordpress_images_posts.csv"""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_posts{ext}"
+
+def load_post_contexts(input_file):
+    """Loads post-level context written by the analyzer (post_id -> context)
     
-    # Add columns if they don't exist
-    if 'ai_image_description' not in df.columns:
-        df['ai_image_description'] = ''
+    Excel: the 'Posts' sheet, other formats: the <name>_posts.<ext> file.
+    """
+    columns = ['post_id', 'context']
+    if input_file.endswith('.xlsx'):
+        posts_df = pd.read_excel(input_file, sheet_name='Posts', usecols=columns)
+    else:
+        posts_df = read_table(posts_table_path(input_file), columns)
+    return dict(zip(posts_df['post_id'], posts_df['context'].fillna('').astype(str)))
+
+def get_row_context(row, post_contexts=None):
+    """Returns the row's own context, or joins it from the post table by post_id"""
+    for column in ('line_context', 'context'):
+        context = row.get(column, '')
+        if isinstance(context, str) and context:
+            return context
+    if post_contexts is not None:
+        return post_contexts.get(row.get('post_id'), '')
+    return ''
+
+def _key_value(value):
+    """Missing cells (NaN/None) compare equal to empty strings in work item keys"""
+    return '' if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)
+
+def plan_work_items(df, post_contexts=None):
+    """
+    Groups rows that would send identical requests - same image, file, context and current alt
+    Returns a list of (key, indices, row): one API call per group, the result goes to every index
+    """
+    groups = {}
+    # Plain dicts - iterrows() builds a Series per row, which dominates on large exports
+    for index, row in zip(df.index, df.to_dict('records')):
+        key = (
+            _key_value(row.get('src_absolute_url')),
+            _key_value(row.get('php_file')),
+            _key_value(get_row_context(row, post_contexts)),
+            _key_value(row.get('current_alt')),
+        )
+        if key in groups:
+            groups[key][1].append(index)
+        else:
+            groups[key] = (key, [index], row)
+    return list(groups.values())
+
+RESULT_COLUMNS = ('ai_image_description', 'ai_alt_text', 'ai_analysis_status', 'ai_approach_used')
+
+def add_result_columns(df, columns=RESULT_COLUMNS):
+    """Adds the AI result columns if they don't exist - existing ones become text columns
+    (an all-empty column read from Excel is float and would not take strings)"""
+    for column in columns:
+        if column not in df.columns:
+            df[column] = ''
+        elif df[column].dtype != object:
+            df[column] = df[column].astype(object)
+
+def merge_results(df, results, columns):
+    """Copies columns of the results frame into df in one aligned update (rows missing from df are ignored)"""
+    add_result_columns(df, columns)
+    index = results.index.intersection(df.index)
+    if len(index):
+        df.loc[index, list(columns)] = results.loc[index, list(columns)].to_numpy()
+
+def ai_alt_text_mask(df):
+    """True for rows that already have a usable AI alt text (not empty, not an error)"""
     if 'ai_alt_text' not in df.columns:
-        df['ai_alt_text'] = ''
-    if 'ai_analysis_status' not in df.columns:
-        df['ai_analysis_status'] = ''
-    if 'ai_approach_used' not in df.columns:
-        df['ai_approach_used'] = ''
-    
-    total = len(df)
-    processed = 0
-    successful = 0
+        return pd.Series(False, index=df.index)
+    text = df['ai_alt_text'].astype(str).str.strip()
+    return df['ai_alt_text'].notna() & (text != '') & ~text.str.startswith('ERROR')
+
+class ResultBuffer:
+    """Collects results column by column and writes them into the DataFrame in one update
+
+    add() only appends to lists - completion order does not matter, the rows of a work
+    item all get the same result.
+    """
+
+    def __init__(self):
+        self.index = []
+        self.columns = {column: [] for column in RESULT_COLUMNS}
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, indices, result, approach):
+        if result["success"]:
+            values = (result["image_description"], result["alt_text"], result["status"])
+        else:
+            values = (result.get("image_description", ""), f"ERROR: {result['error']}", 'error')
+        values += (APPROACH_NAMES[approach],)
+        self.index.extend(indices)
+        for column, value in zip(RESULT_COLUMNS, values):
+            self.columns[column].extend([value] * len(indices))
+
+    def apply(self, df):
+        """Writes the collected results into df and empties the buffer"""
+        if self.index:
+            merge_results(df, pd.DataFrame(self.columns, index=self.index), RESULT_COLUMNS)
+        self.index = []
+        self.columns = {column: [] for column in RESULT_COLUMNS}
+
+async def run_approach(client, approach, img_url, php_file, context, current_alt, delay=1.0, cache=None,
+                       prefetcher=None, clusters=None):
+    """Runs one image through the selected approach"""
+    if approach == 1:
+        return await approach_1_two_step(client, img_url, php_file, context, current_alt, delay, cache, prefetcher,
+                                         clusters)
+    elif approach == 2:
+        return await approach_2_one_step_vision(client, img_url, php_file, context, current_alt, prefetcher)
+    else:  # approach == 3
+        return await approach_3_text_only(client, img_url, php_file, context, current_alt)
+
+async def generate_alt_texts_async(df, client, approach, delay=1.0, post_contexts=None, concurrency=1, cache=None,
+                                   journal=None, prefetcher=None, clusters=None, pack_size=1, metrics=None):
+    """
+    Generates alt texts using the selected approach - async engine
+    client: AsyncOpenAI client
+    concurrency: max rows in flight at once (1 = one request at a time, as before)
+    post_contexts: optional post_id -> context lookup, joined only for rows being processed
+    cache: optional AltTextCache - hits skip the API call entirely
+    journal: optional GenerationJournal - every result is logged as it completes,
+             results already in the journal (resumed run) are applied without a request
+    prefetcher: optional ImagePrefetcher - vision approaches send downscaled inline images
+    clusters: optional ImageClusters (with prefetcher) - approach 1 describes near-duplicate images once
+    pack_size: approach 3 only - up to pack_size images per request (within PACK_TOKEN_BUDGET)
+    metrics: optional RunMetrics - queue wait and per-item time (API calls are recorded by MeteredClient)
+    """
+    print(f"Generating alt texts - {APPROACH_NAMES[approach]} (concurrency: {concurrency})...")
     
-    for index, row in df.iterrows():
-        # Skip if already has alt text
-        current_ai_alt = row.get('ai_alt_text', '')
-        if current_ai_alt and str(current_ai_alt).strip() and not str(current_ai_alt).startswith('ERROR'):
-            print(f"[{index+1}/{total}] Already has alt text, skipping")
-            continue
-            
+    add_result_columns(df)
+    saved = ResultBuffer()
+    
+    # Identical requests are sent once and the result is copied to every row of the group
+    work_items = []
+    resumed = 0
+    for key, indices, row in plan_work_items(df, post_contexts):
+        journal_key = work_item_key(approach, key)
+        result = journal.get(journal_key) if journal is not None else None
+        if result is not None:
+            saved.add(indices, result, approach)
+            resumed += len(indices)
+        else:
+            work_items.append((journal_key, indices, row))
+    if resumed:
+        print(f"Resumed {resumed} images from the journal")
+    
+    rows_to_process = sum(len(indices) for _, indices, _ in work_items)
+    if len(work_items) < rows_to_process:
+        print(f"{rows_to_process} images -> {len(work_items)} unique requests")
+    
+    total = len(work_items)
+    counters = {'processed': 0, 'successful': 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    metrics = metrics if metrics is not None else RunMetrics()
+    # One throttled line instead of several lines per image
+    progress = ProgressLine(rows_to_process, f"{APPROACH_NAMES[approach]} ", PROGRESS_INTERVAL)
+    
+    def finish(journal_key, indices, result):
+        # Journal first - once the line is on disk the result survives a crash
+        if journal is not None:
+            journal.record(journal_key, result)
+        saved.add(indices, result, approach)
+        
+        if result["success"]:
+            counters['successful'] += len(indices)
+        else:
+            progress.message(f"ERROR: {result['error']}")
+        progress.update(len(indices), len(indices) if result["success"] else 0)
+    
+    async def process_group(journal_key, indices, row):
+        img_url = row.get('src_absolute_url', '')
+        queued = time.perf_counter()
         try:
-            processed += 1
+            async with semaphore:
+                metrics.add_time("queue_wait", time.perf_counter() - queued)
+                counters['processed'] += 1
+                
+                img_url = row['src_absolute_url']
+                php_file = row['php_file']
+                context = get_row_context(row, post_contexts)
+                current_alt = row.get('current_alt', '')
+                
+                result = None
+                if cache is not None:
+                    cache_key = AltTextCache.result_key(img_url, approach, ALT_TEXT_MODEL, prompt_version(approach),
+                                                        context, php_file, current_alt)
+                    result = cache.get_result(cache_key)
+                    if result is not None:
+                        metrics.count("cache_hits")
+                
+                if result is None:
+                    with metrics.timer(f"approach_{approach}_item"):
+                        result = await run_approach(client, approach, img_url, php_file, context, current_alt, delay,
+                                                    cache, prefetcher, clusters)
+                    if cache is not None:
+                        cache.put_result(cache_key, result)
+                    
+                    # Delay between requests (for approach 1, delay is in the function)
+                    if approach != 1 and delay:
+                        await asyncio.sleep(delay)
+                
+                finish(journal_key, indices, result)
+            
+        except Exception as e:
+            progress.message(f"ERROR: General error for {img_url}: {e}")
+            saved.add(indices, {"success": False, "error": str(e), "image_description": "", "alt_text": ""}, approach)
+            progress.update(len(indices))
+    
+    async def process_pack(pack):
+        # pack: (journal_key, indices, item, cache_key) - one request for all items
+        queued = time.perf_counter()
+        async with semaphore:
+            metrics.add_time("queue_wait", time.perf_counter() - queued)
+            counters['processed'] += 1
             
+            try:
+                with metrics.timer("approach_3_pack"):
+                    results = await approach_3_packed(client, [item for _, _, item, _ in pack])
+            except Exception as e:
+                progress.message(f"ERROR: General error for packed request: {e}")
+                results = {item[0]: {"success": False, "error": str(e), "image_description": "", "alt_text": ""}
+                           for _, _, item, _ in pack}
+            for journal_key, indices, item, cache_key in pack:
+                result = results[item[0]]
+                if cache is not None:
+                    cache.put_result(cache_key, result)
+                finish(journal_key, indices, result)
+            
+            if delay:
+                await asyncio.sleep(delay)
+    
+    if approach == 3 and pack_size > 1:
+        # Cache hits are applied right away, the rest is packed into as few requests as the budget allows
+        items = []
+        for journal_key, indices, row in work_items:
             img_url = row['src_absolute_url']
             php_file = row['php_file']
-            context = row.get('line_context', '')
+            context = get_row_context(row, post_contexts)
             current_alt = row.get('current_alt', '')
-            
-            print(f"[{processed}/{total}] {img_url}")
-            print(f"    From file: {php_file}")
-            
-            # Select approach
-            if approach == 1:
-                result = approach_1_two_step(client, img_url, php_file, context, current_alt, delay)
-            elif approach == 2:
-                result = approach_2_one_step_vision(client, img_url, php_file, context, current_alt)
-            else:  # approach == 3
-                result = approach_3_text_only(client, img_url, php_file, context, current_alt)
-            
-            # Save results
-            if result["success"]:
-                df.at[index, 'ai_image_description'] = result["image_description"]
-                df.at[index, 'ai_alt_text'] = result["alt_text"]
-                df.at[index, 'ai_analysis_status'] = result["status"]
-                df.at[index, 'ai_approach_used'] = approach_names[approach]
-                successful += 1
-                
-                print(f"    Alt text: '{result['alt_text']}'")
-                if result["alt_text"] == "":
-                    print(f"    (marked as decorative)")
-            else:
-                df.at[index, 'ai_alt_text'] = f"ERROR: {result['error']}"
-                df.at[index, 'ai_analysis_status'] = 'error'
-                df.at[index, 'ai_approach_used'] = approach_names[approach]
-                print(f"    ERROR: {result['error']}")
-            
-            # Delay between requests (for approach 1, delay is in the function)
-            if approach != 1:
-                time.sleep(delay)
-            
-        except Exception as e:
-            print(f"ERROR: General error for {img_url}: {e}")
-            df.at[index, 'ai_alt_text'] = f"ERROR: {str(e)}"
-            df.at[index, 'ai_analysis_status'] = 'error'
-            continue
+            cache_key = None
+            if cache is not None:
+                cache_key = AltTextCache.result_key(img_url, approach, ALT_TEXT_MODEL, prompt_version(approach),
+                                                    context, php_file, current_alt)
+                result = cache.get_result(cache_key)
+                if result is not None:
+                    metrics.count("cache_hits")
+                    finish(journal_key, indices, result)
+                    continue
+            item = (str(len(items) + 1), img_url, php_file, context, current_alt)
+            items.append((journal_key, indices, item, cache_key))
+        
+        # plan_packs keeps the order, so packs are consecutive slices of items
+        packs = []
+        start = 0
+        for item_pack in plan_packs([item for _, _, item, _ in items], pack_size, PACK_TOKEN_BUDGET):
+            packs.append(items[start:start + len(item_pack)])
+            start += len(item_pack)
+        print(f"{len(items)} images packed into {len(packs)} requests")
+        tasks = [process_pack(pack) for pack in packs]
+    else:
+        tasks = [process_group(journal_key, indices, row) for journal_key, indices, row in work_items]
+    
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # Also on interrupt - finished results are kept
+        progress.close()
+        saved.apply(df)
+        if prefetcher is not None:
+            await prefetcher.close()
+
+    print(f"Completed! Processed {rows_to_process} images in {counters['processed']} requests, "
+          f"successful: {counters['successful']}")
+    return df
+
+def build_online_client(api_key, metrics):
+    """Async client stack of an online run - returns (client, limiter, breaker)
+
+    SDK retries are off - the resilience layer retries transient errors, a 429 also pauses
+    the rate limiter for Retry-After. Every API call's latency and usage is recorded in
+    metrics - latencies exclude limiter and retry waits.
+    """
+    limiter = RateLimiter(RATE_LIMITS)
+    breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+    client = ResilientClient(
+        RateLimitedClient(MeteredClient(AsyncOpenAI(api_key=api_key, max_retries=0), metrics), limiter, max_retries=0),
+        breaker, MAX_RETRIES, REQUEST_TIMEOUT
+    )
+    return client, limiter, breaker
+
+def route_groups(df, post_contexts=None):
+    """Auto approach - routes every row, returns {approach: rows} (approach 3 first, it is the cheapest)"""
+    route_images(df, post_contexts, get_row_context)
+    groups = dict(list(df.groupby('ai_route')))
+    return {route_approach: groups[route_approach] for route_approach in (3, 2, 1) if route_approach in groups}
+
+def print_run_summary(metrics, client=None, limiter=None, breaker=None, cache=None, prefetcher=None, clusters=None):
+    """API usage, latency, resilience, cache and prefetch figures of a finished run"""
+    totals = metrics.report()["totals"]
+    print(f"\nAPI: {totals['requests']} requests, {totals['prompt_tokens']} prompt tokens "
+          f"({totals['cached_tokens']} cached, {totals['cache_hit_ratio']:.0%}), "
+          f"{totals['completion_tokens']} completion tokens, cost ${totals['cost_usd']:.4f}")
+    if totals['latency_p50'] is not None:
+        print(f"API latency: p50 {totals['latency_p50']:.2f}s, p95 {totals['latency_p95']:.2f}s, "
+              f"p99 {totals['latency_p99']:.2f}s")
+    if limiter is not None:
+        print(f"Rate limiter: {limiter.stats['requests']} requests, {limiter.stats['rate_limited']} rate-limit pauses, "
+              f"{limiter.stats['waited_seconds']:.0f}s spent waiting for budget")
+    if breaker is not None:
+        print(f"Resilience: {client.stats['retries']} retries ({client.stats['timeouts']} timeouts), "
+              f"{client.stats['failed']} requests failed for good, circuit breaker opened {breaker.stats['opened']}x "
+              f"({breaker.stats['waited_seconds']:.0f}s paused)")
+    if cache is not None:
+        print(f"Cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses, "
+              f"{cache.stats['description_hits']} reused image descriptions")
+    if prefetcher is not None:
+        stats = prefetcher.stats
+        print(f"Image prefetch: {stats['downloaded']} downloaded ({stats['bytes_downloaded'] / 1024 / 1024:.1f} MB -> "
+              f"{stats['bytes_sent'] / 1024 / 1024:.1f} MB inline), {stats['cached']} from disk cache, "
+              f"{stats['failed']} sent as URL")
+    if clusters is not None:
+        print(f"Image clusters: {clusters.stats['images']} images -> {clusters.stats['clusters']} distinct "
+              f"({clusters.stats['by_name']} size variants by name), {clusters.stats['shared']} descriptions shared")
+
+def generate_alt_texts_multi_approach(df, client, approach, delay=1.0, post_contexts=None, concurrency=1, cache=None,
+                                      journal=None, prefetcher=None, clusters=None, pack_size=1, metrics=None):
+    """
+    Generates alt texts using the selected approach
+    Runs the async engine - client must be an AsyncOpenAI client
+    """
+    return asyncio.run(generate_alt_texts_async(df, client, approach, delay, post_contexts, concurrency, cache, journal,
+                                                prefetcher, clusters, pack_size, metrics))
 
-    print(f"\nCompleted! Processed {processed} images, successful: {successful}")
+async def generate_routes_async(df, routes, client, delay=1.0, post_contexts=None, concurrency=1, cache=None,
+                                journal=None, prefetcher=None, clusters=None, pack_size=1, metrics=None):
+    """Runs every route (approach -> rows, see route_groups) through the async engine and merges
+    the results into df - one route after the other, in the same event loop, because the client
+    stack (rate limiter locks, circuit breaker) is shared and bound to the loop it runs in"""
+    for route_approach, route_df in routes.items():
+        route_df = await generate_alt_texts_async(route_df.copy(), client, route_approach, delay, post_contexts,
+                                                  concurrency, cache, journal, prefetcher, clusters,
+                                                  pack_size if route_approach == 3 else 1, metrics)
+        merge_results(df, route_df, [column for column in RESULT_COLUMNS + ('ai_route_reason',)
+                                     if column in route_df.columns])
     return df
 
+def generate_routes(df, routes, client, delay=1.0, post_contexts=None, concurrency=1, cache=None, journal=None,
+                    prefetcher=None, clusters=None, pack_size=1, metrics=None):
+    """Runs generate_routes_async in one event loop - client must be an AsyncOpenAI client"""
+    return asyncio.run(generate_routes_async(df, routes, client, delay, post_contexts, concurrency, cache, journal,
+                                             prefetcher, clusters, pack_size, metrics))
+
+def _record_batch_usage(metrics, requests, batch_results):
+    """Adds the usage of finished batch requests to RunMetrics (batches have no per-request latency)"""
+    if metrics is None:
+        return
+    for custom_id, body in requests:
+        result = batch_results.get(custom_id, {"error": "missing"})
+        metrics.record_request(body["model"], template_name(body["messages"]), usage=result.get("usage"),
+                               error="error" in result)
+
+def generate_alt_texts_batch(df, client, approach, post_contexts=None, cache=None, journal=None,
+                             batch_prefix="alt_text_batch", poll_interval=60, metrics=None):
+    """
+    Generates alt texts through the OpenAI Batch API - for large offline runs
+    client: synchronous OpenAI client
+    Approach 1 runs as two dependent batches: image descriptions first, then alt texts.
+    Batch input files are written as <batch_prefix>_descriptions.jsonl / <batch_prefix>_alt_texts.jsonl
+    metrics: optional RunMetrics - tokens and cost of the batch requests
+    """
+    print(f"Generating alt texts - {APPROACH_NAMES[approach]} (Batch API)...")
+    add_result_columns(df)
+    saved = ResultBuffer()
+    
+    # Same planning as the online engine - identical requests are sent once
+    work_items = []
+    for key, indices, row in plan_work_items(df, post_contexts):
+        journal_key = work_item_key(approach, key)
+        img_url, php_file, context, current_alt = key
+        result = journal.get(journal_key) if journal is not None else None
+        if result is None and cache is not None:
+            cache_key = AltTextCache.result_key(img_url, approach, ALT_TEXT_MODEL, prompt_version(approach),
+                                                context, php_file, current_alt)
+            result = cache.get_result(cache_key)
+        if result is not None:
+            saved.add(indices, result, approach)
+        else:
+            work_items.append((journal_key, indices, key))
+    print(f"{len(work_items)} requests to send")
+    
+    # Batch 1 (approach 1 only): one description per image URL
+    descriptions = {}
+    if approach == 1:
+        description_requests = []
+        for img_url in dict.fromkeys(key[0] for _, _, key in work_items):
+            description_key = AltTextCache.description_key(img_url, DESCRIPTION_MODEL, DESCRIPTION.version)
+            cached = cache.get_description(description_key) if cache is not None else None
+            if cached is not None:
+                descriptions[img_url] = {"content": cached}
+            else:
+                description_requests.append((img_url, description_key))
+        
+        requests = [(f"desc-{n}", build_description_request(img_url))
+                    for n, (img_url, _) in enumerate(description_requests)]
+        with metrics.timer("description_batch") if metrics is not None else contextlib.nullcontext():
+            batch_results = run_batch(client, requests, f"{batch_prefix}_descriptions.jsonl", "image descriptions",
+                                      poll_interval)
+        _record_batch_usage(metrics, requests, batch_results)
+        for n, (img_url, description_key) in enumerate(description_requests):
+            result = batch_results.get(f"desc-{n}", {"error": "missing from batch output"})
+            if "content" in result:
+                result = {"content": result["content"].strip()}
+                if cache is not None:
+                    cache.put_description(description_key, result["content"])
+            descriptions[img_url] = result
+    
+    # Batch 2: alt texts
+    alt_requests = []
+    results = {}
+    for n, (journal_key, indices, key) in enumerate(work_items):
+        img_url, php_file, context, current_alt = key
+        image_description = ""
+        if approach == 1:
+            description = descriptions[img_url]
+            if "error" in description:
+                results[n] = {"success": False, "error": f"Step 1 error: {description['error']}",
+                              "image_description": "", "alt_text": ""}
+                continue
+            image_description = description["content"]
+        alt_requests.append((f"alt-{n}", build_alt_text_request(approach, img_url, php_file, context, current_alt,
+                                                                  image_description)))
+    
+    with metrics.timer("alt_text_batch") if metrics is not None else contextlib.nullcontext():
+        batch_results = run_batch(client, alt_requests, f"{batch_prefix}_alt_texts.jsonl", "alt texts", poll_interval)
+    _record_batch_usage(metrics, alt_requests, batch_results)
+    
+    # Merge by custom_id
+    successful = 0
+    for n, (journal_key, indices, key) in enumerate(work_items):
+        if n not in results:
+            image_description = descriptions[key[0]]["content"] if approach == 1 else ONE_STEP_DESCRIPTIONS[approach]
+            batch_result = batch_results.get(f"alt-{n}", {"error": "missing from batch output"})
+            if "content" in batch_result:
+                results[n] = parse_alt_text(batch_result["content"], image_description)
+            else:
+                results[n] = {"success": False, "error": batch_result["error"],
+                              "image_description": image_description if approach == 1 else "", "alt_text": ""}
+        result = results[n]
+        
+        if journal is not None:
+            journal.record(journal_key, result)
+        if cache is not None:
+            img_url, php_file, context, current_alt = key
+            cache.put_result(AltTextCache.result_key(img_url, approach, ALT_TEXT_MODEL, prompt_version(approach),
+                                                     context, php_file, current_alt), result)
+        saved.add(indices, result, approach)
+        if result["success"]:
+            successful += len(indices)
+    saved.apply(df)
+    
+    rows_to_process = sum(len(indices) for _, indices, _ in work_items)
+    print(f"\nCompleted! Processed {rows_to_process} images in {len(work_items)} requests, successful: {successful}")
+    return df
+
+def estimate_costs(df, approach, post_contexts=None, journal=None, pack_size=1, price_factor=1.0):
+    """Prints the request and cost estimate for one approach, returns the estimated cost in USD"""
+    work_items = [(key, indices, row) for key, indices, row in plan_work_items(df, post_contexts)
+                  if journal is None or journal.get(work_item_key(approach, key)) is None]
+    rows_to_process = sum(len(indices) for _, indices, _ in work_items)
+    unique_requests = len(work_items)
+    if rows_to_process:
+        print(f"   Deduplication: {rows_to_process} images -> {unique_requests} unique requests "
+              f"({rows_to_process / unique_requests:.2f}x, {1 - unique_requests / rows_to_process:.0%} saved)")
+    # Priced per request from the PRICES table - prompt tokens estimated, completions assumed short
+    description_tokens = ESTIMATED_COMPLETION_TOKENS["description"]
+    alt_tokens = ESTIMATED_COMPLETION_TOKENS["alt_text"]
+    if approach == 1:
+        # Descriptions are requested once per image URL; their text (unknown yet) goes into step 2
+        placeholder = "x" * description_tokens * 4
+        image_urls = dict.fromkeys(key[0] for key, _, _ in work_items)
+        cost = sum(estimate_request_cost(build_description_request(img_url), description_tokens)
+                   for img_url in image_urls)
+        cost += sum(estimate_request_cost(build_alt_text_request(1, *key, image_description=placeholder), alt_tokens)
+                    for key, _, _ in work_items)
+        print(f"   Requests: {len(image_urls) + unique_requests} (Vision: {len(image_urls)}, Text: {unique_requests})")
+    elif approach == 2:
+        cost = sum(estimate_request_cost(build_alt_text_request(2, *key), alt_tokens) for key, _, _ in work_items)
+        print(f"   Requests: {unique_requests} (Vision)")
+    elif pack_size > 1 and work_items:
+        # Packed: instructions are sent once per request
+        items = [(str(n), *key) for n, (key, _, _) in enumerate(work_items, 1)]
+        packs = plan_packs(items, pack_size, PACK_TOKEN_BUDGET)
+        single_tokens = sum(_prompt_tokens(build_alt_text_request(3, *item[1:])["messages"]) for item in items)
+        packed_tokens = sum(_prompt_tokens(_packed_messages(pack)) for pack in packs)
+        cost = sum(estimate_request_cost(build_packed_request(pack), alt_tokens * len(pack)) for pack in packs)
+        print(f"   Requests: {len(packs)} (Text, up to {pack_size} images each)")
+        print(f"   Prompt tokens: ~{packed_tokens} instead of ~{single_tokens} unpacked")
+    else:
+        cost = sum(estimate_request_cost(build_alt_text_request(3, *key), alt_tokens) for key, _, _ in work_items)
+        print(f"   Requests: {unique_requests} (Text)")
+    cost *= price_factor
+    print(f"   Cost: ~${cost:.2f}")
+    return cost
+
 def main():
     """Main function"""
 
@@ -346,29 +861,46 @@ def main():
         print("ERROR: Set your OpenAI API key in the OPENAI_API_KEY variable")
         return
     
-    # Get Excel file path
-    excel_file = input("Enter path to Excel file: ").strip().strip('"')
+    # Get input file path
+    excel_file = input("Enter path to Excel/CSV/JSONL/Parquet file: ").strip().strip('"')
     
-    if not excel_file.endswith('.xlsx'):
+    if not excel_file.endswith(INPUT_FORMATS):
         excel_file += '.xlsx'
     
     try:
-        # Check available sheets
-        excel_sheets = pd.ExcelFile(excel_file).sheet_names
-        print(f"\nAvailable sheets: {', '.join(excel_sheets)}")
-
-        # Select sheet
-        if len(excel_sheets) == 1:
-            sheet_name = excel_sheets[0]
-            print(f"Using the only sheet: {sheet_name}")
+        if not excel_file.endswith('.xlsx'):
+            # Columnar formats hold a single table
+            sheet_name = 'Images'
+            df = read_table(excel_file)
+            print(f"Loaded {len(df)} rows from {excel_file}")
+            
+            post_contexts = None
+            if os.path.exists(posts_table_path(excel_file)) and 'post_id' in df.columns:
+                post_contexts = load_post_contexts(excel_file)
+                print(f"Loaded context for {len(post_contexts)} posts")
         else:
-            sheet_name = input(f"Choose sheet (default '{excel_sheets[0]}'): ").strip()
-            if not sheet_name:
+            # Check available sheets
+            excel_sheets = pd.ExcelFile(excel_file).sheet_names
+            print(f"\nAvailable sheets: {', '.join(excel_sheets)}")
+
+            # Select sheet
+            if len(excel_sheets) == 1:
                 sheet_name = excel_sheets[0]
+                print(f"Using the only sheet: {sheet_name}")
+            else:
+                sheet_name = input(f"Choose sheet (default '{excel_sheets[0]}'): ").strip()
+                if not sheet_name:
+                    sheet_name = excel_sheets[0]
         
-        # Load data
-        df = pd.read_excel(excel_file, sheet_name=sheet_name)
-        print(f"Loaded {len(df)} rows from sheet '{sheet_name}'")
+            # Load data
+            df = pd.read_excel(excel_file, sheet_name=sheet_name)
+            print(f"Loaded {len(df)} rows from sheet '{sheet_name}'")
+        
+            # Post context is stored once per post - joined per row only when generating
+            post_contexts = None
+            if 'Posts' in excel_sheets and sheet_name != 'Posts' and 'post_id' in df.columns:
+                post_contexts = load_post_contexts(excel_file)
+                print(f"Loaded context for {len(post_contexts)} posts")
         
     except FileNotFoundError:
         print(f"ERROR: File not found: {excel_file}")
@@ -377,6 +909,9 @@ def main():
         print(f"ERROR: Loading error: {e}")
         return
     
+    # Tables written by the analyzer (img_src, post_url, context) are mapped to the generator columns
+    df = to_generation_frame(df)
+    
     # Check required columns
     required_columns = ['src_absolute_url', 'php_file']
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -389,13 +924,9 @@ def main():
     # Show statistics
     total_images = len(df)
     
-    if 'ai_alt_text' in df.columns:
-        with_ai_alt = len(df[df['ai_alt_text'].notna() & 
-                            (df['ai_alt_text'].astype(str).str.strip() != '') &
-                            ~df['ai_alt_text'].astype(str).str.startswith('ERROR')])
-    else:
-        with_ai_alt = 0
-    
+    # Computed once - the statistics and the filter options below reuse it
+    has_ai_alt = ai_alt_text_mask(df)
+    with_ai_alt = int(has_ai_alt.sum())
     without_ai_alt = total_images - with_ai_alt
 
     print(f"\nSTATISTICS:")
@@ -411,20 +942,23 @@ def main():
     print("   Faster than two-step, good quality")
     print("3. One-step (text): Only URL + context → alt text")
     print("   Fastest and cheapest, based on filenames")
+    print("4. Auto: each image gets the cheapest approach that fits")
+    print("   Logos, icons, decorative and well-named images → 3, other content images → 2 or 1")
     
     while True:
-        approach_choice = input("\nChoose approach (1/2/3): ").strip()
-        if approach_choice in ['1', '2', '3']:
+        approach_choice = input("\nChoose approach (1/2/3/4): ").strip()
+        if approach_choice in ['1', '2', '3', '4']:
             approach = int(approach_choice)
             break
-        print("ERROR: Invalid choice, enter 1, 2 or 3")
+        print("ERROR: Invalid choice, enter 1, 2, 3 or 4")
 
-    approach_names = {
-        1: "Two-step (Vision + Text)",
-        2: "One-step (Vision)",
-        3: "One-step (Text)"
-    }
-    print(f"Selected: {approach_names[approach]}")
+    print(f"Selected: {APPROACH_NAMES[approach]}")
+
+    # Every result is appended to the journal as it completes - a crash loses only requests in flight
+    resume = "--resume" in sys.argv[1:]
+    journal = GenerationJournal(journal_path(excel_file, approach), resume)
+    if resume:
+        print(f"Resuming: {len(journal.results)} finished requests in {journal.path}")
 
     # Filtering options
     print(f"\nWHICH IMAGES TO PROCESS:")
@@ -446,13 +980,7 @@ def main():
         print(f"Processing all {len(df)} images (overwriting)")
         
     elif filter_choice == "2":
-        if 'ai_alt_text' in df.columns:
-            mask = df['ai_alt_text'].isna() | \
-                   (df['ai_alt_text'].astype(str).str.strip() == '') | \
-                   df['ai_alt_text'].astype(str).str.startswith('ERROR')
-            df_to_process = df[mask].copy()
-        else:
-            df_to_process = df.copy()
+        df_to_process = df[~has_ai_alt].copy()
         print(f"Processing {len(df_to_process)} images without AI alt text")
         
     elif filter_choice == "3":
@@ -470,12 +998,7 @@ def main():
             df_to_process = df.head(3).copy()
     else:
         print("ERROR: Invalid choice, using option 2")
-        if 'ai_alt_text' in df.columns:
-            mask = df['ai_alt_text'].isna() | \
-                   (df['ai_alt_text'].astype(str).str.strip() == '')
-            df_to_process = df[mask].copy()
-        else:
-            df_to_process = df.copy()
+        df_to_process = df[~has_ai_alt].copy()
 
     if len(df_to_process) == 0:
         print("ERROR: No images to process")
@@ -483,25 +1006,53 @@ def main():
 
     print(f"\nTo process: {len(df_to_process)} images")
     
-    # Set delay
-    if approach == 1:
-        delay = float(input("Delay between steps (seconds, default 1.0): ") or "1.0")
-        print("Note: Two-step approach makes 2 requests per image")
+    # Auto: every image goes to the cheapest approach that fits, the rest of the run is per route
+    if approach == AUTO_APPROACH:
+        routes = route_groups(df_to_process, post_contexts)
+        print(f"\nROUTING:")
+        for route_approach, route_df in routes.items():
+            print(f"   {APPROACH_NAMES[route_approach]}: {len(route_df)} images")
+            for reason, count in route_df['ai_route_reason'].value_counts().items():
+                print(f"      {reason}: {count}")
     else:
-        delay = float(input("Delay between requests (seconds, default 1.0): ") or "1.0")
-
-    # Estimated costs
-    estimated_requests = len(df_to_process) * (2 if approach == 1 else 1)
-    print(f"\nESTIMATED COSTS:")
-    if approach == 1:
-        print(f"   Requests: {estimated_requests} (Vision: {len(df_to_process)}, Text: {len(df_to_process)})")
-        print(f"   Cost: ~${estimated_requests * 0.01:.2f}")
-    elif approach == 2:
-        print(f"   Requests: {estimated_requests} (Vision)")
-        print(f"   Cost: ~${estimated_requests * 0.01:.2f}")
+        routes = {approach: df_to_process}
+    
+    # Run mode
+    print(f"\nRUN MODE:")
+    print("1. Online - results within minutes (default)")
+    print(f"2. Batch API - {BATCH_DISCOUNT:.0%} cheaper, results within 24 hours (for large offline runs)")
+    batch_mode = input("Choose mode (1/2): ").strip() == "2"
+    
+    if batch_mode:
+        delay, concurrency = 0, 1
+        if 1 in routes:
+            print("Note: Two-step approach runs as two batches (descriptions, then alt texts)")
     else:
-        print(f"   Requests: {estimated_requests} (Text)")
-        print(f"   Cost: ~${estimated_requests * 0.005:.2f}")
+        # Throttling - the rate limiter keeps requests within RATE_LIMITS, the delay is optional
+        if 1 in routes:
+            delay = float(input("Extra delay between steps (seconds, default 0 - rate limiter throttles): ") or "0")
+            print("Note: Two-step approach makes 2 requests per image")
+        else:
+            delay = float(input("Extra delay between requests (seconds, default 0 - rate limiter throttles): ") or "0")
+        
+        concurrency = int(input("Concurrent requests (default 10): ") or "10")
+        print(f"Up to {concurrency} requests at once, limits: " +
+              ", ".join(f"{model} {limits['rpm']} RPM / {limits['tpm']} TPM" for model, limits in RATE_LIMITS.items()))
+
+    # Approach 3 online: several images per request
+    pack_sizes = {route_approach: PACK_SIZE if route_approach == 3 and not batch_mode else 1 for route_approach in routes}
+
+    # Estimated costs - identical requests are sent once
+    price_factor = 1 - BATCH_DISCOUNT if batch_mode else 1
+    print(f"\nESTIMATED COSTS:" + (" (Batch API)" if batch_mode else ""))
+    total_cost = 0.0
+    for route_approach, route_df in routes.items():
+        if len(routes) > 1:
+            print(f"  {APPROACH_NAMES[route_approach]} - {len(route_df)} images")
+        total_cost += estimate_costs(route_df, route_approach, post_contexts, journal, pack_sizes[route_approach],
+                                     price_factor)
+    if len(routes) > 1:
+        print(f"  Total cost: ~${total_cost:.2f}")
     
     # Confirm
     confirm = input(f"\nAre you sure you want to continue? (yes/no): ").strip().lower()
@@ -509,32 +1060,58 @@ def main():
         print("Cancelled")
         return
     
-    # Initialize OpenAI client
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Initialize OpenAI client (async - requests can run concurrently)
+    # Batch mode uploads files instead - the Batch API has its own limits, no rate limiter
+    metrics = RunMetrics(price_factor=price_factor)
+    if batch_mode:
+        client, limiter, breaker = OpenAI(api_key=OPENAI_API_KEY), None, None
+    else:
+        client, limiter, breaker = build_online_client(OPENAI_API_KEY, metrics)
+    # Results of earlier runs are reused - re-running the same export only pays for new images
+    cache = AltTextCache(CACHE_FILE, CACHE_MAX_ENTRIES, CACHE_MAX_AGE_DAYS) if CACHE_FILE else None
+    # Vision approaches: images are fetched locally, downscaled and inlined (online mode only -
+    # batch input files are capped in size, so batches keep the image URLs)
+    prefetcher = None
+    if IMAGE_PREFETCH and (1 in routes or 2 in routes) and not batch_mode:
+        try:
+            prefetcher = ImagePrefetcher(IMAGE_CACHE_DIR, IMAGE_DETAIL, PREFETCH_CONCURRENCY)
+        except ImportError as e:
+            print(f"WARNING: {e} - sending original image URLs")
+    clusters = ImageClusters(CLUSTER_MAX_DISTANCE) if IMAGE_CLUSTERING and 1 in routes and prefetcher else None
     
     # Generate alt texts
     start_time = time.time()
     try:
-        df_to_process = generate_alt_texts_multi_approach(df_to_process, client, approach, delay)
-        
-        # Update main DataFrame
-        for idx in df_to_process.index:
-            if idx in df.index:
-                df.at[idx, 'ai_alt_text'] = df_to_process.at[idx, 'ai_alt_text']
-                df.at[idx, 'ai_analysis_status'] = df_to_process.at[idx, 'ai_analysis_status']
-                df.at[idx, 'ai_approach_used'] = df_to_process.at[idx, 'ai_approach_used']
-                if 'ai_image_description' in df_to_process.columns:
-                    df.at[idx, 'ai_image_description'] = df_to_process.at[idx, 'ai_image_description']
+        if batch_mode:
+            for route_approach, route_df in routes.items():
+                batch_prefix = (f"php_images_approach_{route_approach}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                                f"_batch")
+                route_df = generate_alt_texts_batch(route_df.copy(), client, route_approach, post_contexts, cache,
+                                                    journal, batch_prefix, BATCH_POLL_INTERVAL, metrics)
+                # Update main DataFrame - one aligned update per route
+                merge_results(df, route_df, [column for column in RESULT_COLUMNS + ('ai_route_reason',)
+                                             if column in route_df.columns])
+        else:
+            # All routes in one event loop - they share the rate limiter and the circuit breaker
+            generate_routes(df, routes, client, delay, post_contexts, concurrency, cache, journal, prefetcher,
+                            clusters, PACK_SIZE, metrics)
 
     except KeyboardInterrupt:
         print("\nInterrupted by user")
+        print(f"Finished results are in {journal.path} - run again with --resume to continue")
+    finally:
+        journal.close()
     
     end_time = time.time()
     duration = end_time - start_time
+    metrics.finish()
+    print_run_summary(metrics, client, limiter, breaker, cache, prefetcher, clusters)
+    if cache is not None:
+        cache.close()
     
     # Save results
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_file = f"php_images_approach_{approach}_{timestamp}.xlsx"
+    output_file = f"php_images_approach_{'auto' if approach == AUTO_APPROACH else approach}_{timestamp}.xlsx"
     
     with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
         # Save updated data
@@ -571,7 +1148,7 @@ def main():
                 'Total AI alt texts'
             ],
             'Value': [
-                approach_names[approach],
+                APPROACH_NAMES[approach],
                 f"{duration:.1f}",
                 total_count,
                 success_count,
@@ -580,10 +1157,26 @@ def main():
                 success_count + decorative_count
             ]
         }
+        for metric, value in metrics.statistics_rows():
+            stats_data['Metric'].append(metric)
+            stats_data['Value'].append(value)
         stats_df = pd.DataFrame(stats_data)
         stats_df.to_excel(writer, sheet_name='Statistics', index=False)
 
+    # Machine-readable run report next to the Excel file
+    report_file = metrics.write_report(
+        f"{os.path.splitext(output_file)[0]}.report.json",
+        input_file=excel_file,
+        output_file=output_file,
+        approach=APPROACH_NAMES[approach],
+        run_mode="batch" if batch_mode else "online",
+        images=total_count,
+        results={"success": success_count, "decorative": decorative_count, "error": error_count},
+        estimated_cost_usd=total_cost
+    )
+
     print(f"\nDONE! Results saved in: {output_file}")
+    print(f"Run report: {report_file}")
     print(f"Processing time: {duration/60:.1f} minutes")
 
     # Show final statistics
@@ -596,7 +1189,7 @@ def main():
         decorative_count = 0
         error_count = 0
 
-    print(f"\nRESULTS - {approach_names[approach]}:")
+    print(f"\nRESULTS - {APPROACH_NAMES[approach]}:")
     print(f"   Generated alt texts: {successful_count}")
     print(f"   Marked as decorative: {decorative_count}")
     print(f"   Errors: {error_count}")
@@ -609,7 +1202,7 @@ def main():
             print(f"{i+1}. {row['php_file']}")
             print(f"   URL: {row['src_absolute_url']}")
             print(f"   Alt: '{row['ai_alt_text']}'")
-            if approach == 1 and 'ai_image_description' in row:
+            if approach in (1, AUTO_APPROACH) and 'ai_image_description' in row:
                 desc = row['ai_image_description']
                 if desc and len(desc) > 5:
                     print(f"   Description: {desc[:80]}...")
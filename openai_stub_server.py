@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+OpenAI stub server - local stand-in for the endpoints the generator uses
+Chat completions, file upload/download and the Batch API, answered with deterministic
+stub alt texts. For trying batch mode and benchmarks without an API key or costs.
+Chat completions can be slowed down and made to fail: fixed latency plus jitter,
+a share of 500 errors and a share of 429 rate-limit responses with Retry-After.
+Batch lines can fail the same way (500, in the batch's error file); lines without
+messages fail with 400.
+
+Run: python openai_stub_server.py [port] [--latency 0.5] [--jitter 0.2] [--error-rate 0.02] [--rate-limit-rate 0.05]
+     [--batch-error-rate 0.01]
+Then point the client at it: OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+"""
+
+import argparse
+import email.parser
+import email.policy
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def static_prefix(body):
+    """System message of a request - the part a provider prompt cache can reuse"""
+    messages = body.get("messages", [])
+    if messages and messages[0].get("role") == "system" and isinstance(messages[0].get("content"), str):
+        return messages[0]["content"]
+    return ""
+
+def stub_completion(body, cached_tokens=0):
+    """Chat completion response for a request body - the answer depends only on the request"""
+    messages = json.dumps(body.get("messages", []), sort_keys=True)
+    digest = hashlib.sha1(messages.encode("utf-8")).hexdigest()[:8]
+    if "Describe what you see" in messages:
+        content = f"Stub description {digest}: a person standing in front of a building."
+    elif (body.get("response_format") or {}).get("type") == "json_object":
+        # Packed approach 3 request - one answer per "### ITEM <id>" block
+        item_ids = re.findall(r"### ITEM (\w+)", messages)
+        content = json.dumps({item_id: f"Stub alt text {digest}-{item_id}" for item_id in item_ids})
+    else:
+        content = f"Stub alt text {digest}"
+    prompt_tokens = len(messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{digest}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", ""),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+    }
+
+class StubState:
+    """Files and batches held in memory, plus the fault settings for chat completions"""
+
+    def __init__(self, polls_until_complete=1, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=0.1, batch_error_rate=0.0, seed=0):
+        self.polls_until_complete = polls_until_complete
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.batch_error_rate = batch_error_rate
+        self.random = random.Random(seed)
+        self.files = {}
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.prefixes = set()
+        self.lock = threading.Lock()
+        self.stats = {"chat_completions": 0, "batch_requests": 0, "batch_errors": 0, "errors": 0, "rate_limited": 0}
+
+    def draw_fault(self):
+        """Returns (delay seconds, None / "error" / "rate_limit") for the next chat completion"""
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return delay, "rate_limit"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, "error"
+        return delay, None
+
+    def cached_tokens(self, body):
+        """Prompt cache emulation - a static prefix of 1024+ tokens seen before is cached in 128-token steps"""
+        prefix = static_prefix(body)
+        tokens = len(prefix) // 4
+        if tokens < 1024:
+            return 0
+        if prefix not in self.prefixes:
+            self.prefixes.add(prefix)
+            return 0
+        return tokens // 128 * 128
+
+    def new_id(self, prefix):
+        return f"{prefix}-{next(self.ids)}"
+
+    def add_file(self, filename, purpose, content):
+        file_id = self.new_id("file")
+        self.files[file_id] = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+            "content": content
+        }
+        return self.files[file_id]
+
+    def create_batch(self, params):
+        batch_id = self.new_id("batch")
+        lines = self.files[params["input_file_id"]]["content"].decode("utf-8").splitlines()
+        requests = [json.loads(line) for line in lines if line.strip()]
+        self.stats["batch_requests"] += len(requests)
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": params["endpoint"],
+            "input_file_id": params["input_file_id"],
+            "completion_window": params.get("completion_window", "24h"),
+            "metadata": params.get("metadata"),
+            "created_at": int(time.time()),
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": len(requests), "completed": 0, "failed": 0},
+            "_requests": requests,
+            "_polls": 0
+        }
+        return self.batches[batch_id]
+
+    def poll_batch(self, batch_id):
+        """Advances the batch: validating -> in_progress -> completed after polls_until_complete polls"""
+        batch = self.batches[batch_id]
+        if batch["status"] in ("completed", "cancelled"):
+            return batch
+        batch["_polls"] += 1
+        if batch["_polls"] <= self.polls_until_complete:
+            batch["status"] = "in_progress"
+            return batch
+
+        output, errors = [], []
+        for request in batch["_requests"]:
+            if not request["body"].get("messages"):
+                status, body = 400, {"error": {"message": "'messages' is a required property (stub)",
+                                               "type": "invalid_request_error"}}
+            elif self.random.random() < self.batch_error_rate:
+                status, body = 500, {"error": {"message": "The server had an error (stub)", "type": "server_error"}}
+            else:
+                status, body = 200, stub_completion(request["body"])
+            (output if status == 200 else errors).append(json.dumps({
+                "id": self.new_id("batch_req"),
+                "custom_id": request["custom_id"],
+                "response": {"status_code": status, "request_id": self.new_id("req"), "body": body},
+                "error": None
+            }))
+        if output:
+            batch["output_file_id"] = self.add_file(f"{batch_id}_output.jsonl", "batch_output",
+                                                    ("\n".join(output) + "\n").encode("utf-8"))["id"]
+        if errors:
+            batch["error_file_id"] = self.add_file(f"{batch_id}_errors.jsonl", "batch_output",
+                                                   ("\n".join(errors) + "\n").encode("utf-8"))["id"]
+        self.stats["batch_errors"] += len(errors)
+        batch["request_counts"]["completed"] = len(output)
+        batch["request_counts"]["failed"] = len(errors)
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+        return batch
+
+def public(record):
+    """Record without the server-side fields (content, _requests, ...)"""
+    return {key: value for key, value in record.items() if not key.startswith("_") and key != "content"}
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chat_completion(self, body):
+        """Latency and injected faults happen outside the lock - concurrent requests overlap"""
+        state = self.state
+        delay, fault = state.draw_fault()
+        if delay:
+            time.sleep(delay)
+        with state.lock:
+            if fault == "rate_limit":
+                state.stats["rate_limited"] += 1
+            elif fault == "error":
+                state.stats["errors"] += 1
+            else:
+                state.stats["chat_completions"] += 1
+                request = json.loads(body)
+                response = stub_completion(request, state.cached_tokens(request))
+        if fault == "rate_limit":
+            self._send_json({"error": {"message": "Rate limit reached (stub)", "type": "requests",
+                                       "code": "rate_limit_exceeded"}},
+                            429, {"retry-after-ms": str(int(state.retry_after * 1000))})
+        elif fault == "error":
+            self._send_json({"error": {"message": "The server had an error (stub)", "type": "server_error"}}, 500)
+        else:
+            self._send_json(response)
+
+    def _not_found(self):
+        self._send_json({"error": {"message": f"Unknown endpoint: {self.command} {self.path}", "type": "invalid_request_error"}}, 404)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _read_multipart(self, body):
+        """Form fields of a multipart/form-data upload: name -> (filename, bytes)"""
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+        message = email.parser.BytesParser(policy=email.policy.default).parsebytes(header + body)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+        return fields
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        body = self._read_body()
+        if path.endswith("/chat/completions"):
+            self._chat_completion(body)
+            return
+        state = self.state
+        with state.lock:
+            if path.endswith("/files"):
+                fields = self._read_multipart(body)
+                filename, content = fields["file"]
+                purpose = fields.get("purpose", (None, b"batch"))[1].decode("utf-8")
+                self._send_json(public(state.add_file(filename or "upload.jsonl", purpose, content)))
+            elif path.endswith("/batches"):
+                self._send_json(public(state.create_batch(json.loads(body))))
+            elif re.search(r"/batches/[^/]+/cancel$", path):
+                batch = state.batches[path.split("/")[-2]]
+                batch["status"] = "cancelled"
+                self._send_json(public(batch))
+            else:
+                self._not_found()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        state = self.state
+        with state.lock:
+            match = re.search(r"/files/([^/]+)(/content)?$", path)
+            if match and match.group(1) in state.files:
+                record = state.files[match.group(1)]
+                if match.group(2):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(record["content"])))
+                    self.end_headers()
+                    self.wfile.write(record["content"])
+                else:
+                    self._send_json(public(record))
+                return
+            match = re.search(r"/batches/([^/]+)$", path)
+            if match and match.group(1) in state.batches:
+                self._send_json(public(state.poll_batch(match.group(1))))
+                return
+            self._not_found()
+
+class StubOpenAIServer:
+    """Stub server on a background thread - use as a context manager
+
+        with StubOpenAIServer() as server:
+            client = OpenAI(api_key="stub", base_url=server.base_url)
+    """
+
+    def __init__(self, port=0, polls_until_complete=1, **faults):
+        """faults: latency, jitter, error_rate, rate_limit_rate, retry_after, batch_error_rate, seed (see StubState)"""
+        self.state = StubState(polls_until_complete, **faults)
+        handler = type("Handler", (StubHandler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI stub server")
+    parser.add_argument("port", nargs="?", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every chat completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds (0..jitter)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of chat completions answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share answered with 429 + Retry-After")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After of the 429 responses (seconds)")
+    parser.add_argument("--batch-error-rate", type=float, default=0.0, help="share of batch lines failing with 500")
+    args = parser.parse_args()
+    server = StubOpenAIServer(args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                              batch_error_rate=args.batch_error_rate)
+    print(f"OpenAI stub server on {server.base_url} - Ctrl+C to stop")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
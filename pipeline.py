@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Pipeline - scans a WordPress export and generates alt texts in one process
+Image records stream from the analyzer into the generation engine in chunks of --chunk-size
+images, and each chunk's results are appended to the output file (CSV / JSONL / Parquet) as soon
+as it is done. There is no Excel file in between and no prompts, so it can run from cron or CI.
+
+Run: python pipeline.py wp_posts_export.json --base-url https://example.com [--approach 4] [--output alt_texts.jsonl]
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import time
+
+import pandas as pd
+
+import multi_approach_alt_generator as generator
+from alt_text_cache import AltTextCache
+from generation_journal import GenerationJournal, journal_path
+from image_prefetch import ImageClusters, ImagePrefetcher
+from image_records import to_generation_record
+from image_writers import WRITERS
+from run_metrics import RunMetrics
+from wordpress_image_analyzer import CONTEXT_TOKEN_BUDGET, iter_images, load_posts, new_debug_stats, print_debug_stats
+
+# Images handed to the generation engine at once - memory stays flat, the cache and the journal span chunks
+CHUNK_SIZE = 5000
+
+def iter_generation_records(posts, base_url='', missing_alt_only=False, context_tokens=CONTEXT_TOKEN_BUDGET,
+                            workers=1, debug_stats=None):
+    """Generator rows (see image_records) for every image in the posts, in export order"""
+    for images, _ in iter_images(posts, base_url, context_tokens, workers, keep_posts=False, debug_stats=debug_stats,
+                                 verbose=False):
+        for image in images:
+            if missing_alt_only and image['has_alt']:
+                continue
+            yield to_generation_record(image, base_url)
+
+def iter_chunks(records, size):
+    """Lists of up to size records"""
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+async def generate_chunk(df, client, approach, concurrency=10, delay=0, cache=None, journal=None, prefetcher=None,
+                         clusters=None, pack_size=1, metrics=None):
+    """Runs one chunk through the async engine (approach 4 routes each image first), returns df with the results"""
+    if approach == generator.AUTO_APPROACH:
+        routes = generator.route_groups(df)
+    else:
+        routes = {approach: df}
+    return await generator.generate_routes_async(df, routes, client, delay, None, concurrency, cache, journal,
+                                                 prefetcher, clusters, pack_size, metrics)
+
+async def run_pipeline_async(records, client, approach, writer, concurrency=10, delay=0, cache=None, journal=None,
+                             prefetcher=None, clusters=None, pack_size=1, metrics=None, chunk_size=CHUNK_SIZE):
+    """Generates alt texts for a stream of generator rows, writing each chunk - returns result counts"""
+    counts = {'images': 0, 'success': 0, 'decorative': 0, 'error': 0}
+    for number, chunk in enumerate(iter_chunks(records, chunk_size), 1):
+        print(f"\nChunk {number}: {len(chunk)} images ({counts['images'] + len(chunk)} so far)")
+        df = await generate_chunk(pd.DataFrame(chunk), client, approach, concurrency, delay, cache, journal,
+                                  prefetcher, clusters, pack_size, metrics)
+        writer.write_rows(df.to_dict('records'))
+        counts['images'] += len(df)
+        for status, count in df['ai_analysis_status'].value_counts().items():
+            if status in counts:
+                counts[status] += int(count)
+    return counts
+
+def run_pipeline(export, base_url='', approach=3, output_file='wordpress_alt_texts.jsonl', api_key=None,
+                 concurrency=10, delay=0, pack_size=None, missing_alt_only=False, limit=None, chunk_size=CHUNK_SIZE,
+                 context_tokens=CONTEXT_TOKEN_BUDGET, workers=1, resume=False, client=None, table=None):
+    """
+    Scans an export and generates alt texts for its images - returns the run report (dict)
+    export: JSON export, mysqldump (.sql/.sql.gz), SQLite file or mysql:// URL (see load_posts),
+            or an iterable of post records (as load_wp_posts yields them)
+    base_url: site URL - post URLs are built from it, relative image sources are resolved against them
+    output_file: .csv / .jsonl / .parquet - analyzer columns plus the generator result columns,
+                 the run report goes next to it (<output>.report.json)
+    limit: stop after this many images (test runs)
+    resume: replay the journal of an interrupted run with the same output file and approach
+    client: async chat client to use instead of the online client stack (e.g. a FaultInjectingClient)
+    table: posts table of a dump or database (default: the first <prefix>posts table)
+    """
+    fmt = os.path.splitext(output_file)[1].lstrip('.')
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported output format: {output_file} (use one of {', '.join(WRITERS)})")
+    if pack_size is None:
+        pack_size = generator.PACK_SIZE
+
+    metrics = RunMetrics()
+    limiter = breaker = None
+    if client is None:
+        api_key = api_key or os.environ.get('OPENAI_API_KEY') or generator.OPENAI_API_KEY
+        if api_key == "sk-your-api-key-here":
+            raise ValueError("Set your OpenAI API key (--api-key or the OPENAI_API_KEY environment variable)")
+        client, limiter, breaker = generator.build_online_client(api_key, metrics)
+
+    cache = None
+    if generator.CACHE_FILE:
+        cache = AltTextCache(generator.CACHE_FILE, generator.CACHE_MAX_ENTRIES, generator.CACHE_MAX_AGE_DAYS)
+    prefetcher = None
+    if generator.IMAGE_PREFETCH and approach in (1, 2, generator.AUTO_APPROACH):
+        try:
+            prefetcher = ImagePrefetcher(generator.IMAGE_CACHE_DIR, generator.IMAGE_DETAIL,
+                                         generator.PREFETCH_CONCURRENCY)
+        except ImportError as e:
+            print(f"WARNING: {e} - sending original image URLs")
+    clusters = None
+    if generator.IMAGE_CLUSTERING and approach in (1, generator.AUTO_APPROACH) and prefetcher:
+        clusters = ImageClusters(generator.CLUSTER_MAX_DISTANCE)
+    # The journal belongs to the output - the export may be a stream without a path
+    journal = GenerationJournal(journal_path(output_file, approach), resume)
+    if resume:
+        print(f"Resuming: {len(journal.results)} finished requests in {journal.path}")
+
+    posts = load_posts(export, table) if isinstance(export, str) else export
+    debug_stats = new_debug_stats()
+    records = iter_generation_records(posts, base_url, missing_alt_only, context_tokens, workers, debug_stats)
+    if limit:
+        records = itertools.islice(records, limit)
+
+    print(f"Pipeline: {generator.APPROACH_NAMES[approach]}, concurrency {concurrency}, output {output_file}")
+    writer = WRITERS[fmt](output_file)
+    counts = {'images': 0}
+    start_time = time.time()
+    try:
+        counts = asyncio.run(run_pipeline_async(records, client, approach, writer, concurrency, delay, cache, journal,
+                                                prefetcher, clusters, pack_size, metrics, chunk_size))
+    finally:
+        writer.close()
+        journal.close()
+
+    metrics.finish()
+    print_debug_stats(debug_stats)
+    generator.print_run_summary(metrics, client, limiter, breaker, cache, prefetcher, clusters)
+    if cache is not None:
+        cache.close()
+
+    extra = dict(
+        input_file=export if isinstance(export, str) else None,
+        output_file=output_file,
+        approach=generator.APPROACH_NAMES[approach],
+        run_mode="pipeline",
+        images=counts['images'],
+        results={status: counts[status] for status in ('success', 'decorative', 'error')}
+    )
+    report_file = metrics.write_report(f"{os.path.splitext(output_file)[0]}.report.json", **extra)
+    print(f"\nDONE! {counts['images']} images in {(time.time() - start_time) / 60:.1f} minutes")
+    print(f"Results: {output_file}, run report: {report_file}")
+    return metrics.report(**extra)
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a WordPress export and generate alt texts in one run")
+    parser.add_argument('export', help="wp_posts source: JSON export, .sql/.sql.gz dump, .sqlite file or mysql:// URL")
+    parser.add_argument('--base-url', default='', help="site URL, e.g. https://example.com")
+    parser.add_argument('--approach', type=int, default=3, choices=sorted(generator.APPROACH_NAMES),
+                        help="1 two-step, 2 one-step vision, 3 text only, 4 auto (default 3)")
+    parser.add_argument('--output', default='wordpress_alt_texts.jsonl', help="results file (.csv, .jsonl, .parquet)")
+    parser.add_argument('--api-key', help="OpenAI API key (default: OPENAI_API_KEY environment variable)")
+    parser.add_argument('--concurrency', type=int, default=10, help="requests in flight at once")
+    parser.add_argument('--delay', type=float, default=0, help="extra delay between requests (seconds)")
+    parser.add_argument('--pack-size', type=int, default=generator.PACK_SIZE, help="approach 3 images per request")
+    parser.add_argument('--missing-alt-only', action='store_true', help="skip images that already have an alt")
+    parser.add_argument('--limit', type=int, help="stop after this many images")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="images per generation chunk")
+    parser.add_argument('--context-tokens', type=int, default=CONTEXT_TOKEN_BUDGET, help="context size per image")
+    parser.add_argument('--workers', type=int, default=1, help="processes for scanning posts")
+    parser.add_argument('--table', help="posts table of a dump or database (default: first <prefix>posts table)")
+    parser.add_argument('--resume', action='store_true', help="continue an interrupted run from its journal")
+    args = parser.parse_args()
+
+    try:
+        run_pipeline(args.export, args.base_url, args.approach, args.output, args.api_key, args.concurrency,
+                     args.delay, args.pack_size, args.missing_alt_only, args.limit, args.chunk_size,
+                     args.context_tokens, args.workers, args.resume, table=args.table)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+    except KeyboardInterrupt:
+        print("\nInterrupted - run again with --resume to continue")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Post sources - wp_posts records straight from a mysqldump file or a database table
+phpMyAdmin JSON exports of large sites are slow to produce and often time out, so these
+readers skip the export step. Every reader streams and yields the same record dicts
+as load_wp_posts(): column name -> value as text, NULL -> None.
+
+- load_wp_posts_sql: INSERT INTO `wp_posts` VALUES (...) statements of a plain or .gz dump
+- load_wp_posts_sqlite: a table of a local SQLite database
+- load_wp_posts_mysql: a MySQL/MariaDB table over a server-side cursor (requires pymysql)
+"""
+
+import gzip
+import re
+import sqlite3
+
+# Column order of wp_posts - used when a dump has neither CREATE TABLE nor column lists
+WP_POSTS_COLUMNS = (
+    'ID', 'post_author', 'post_date', 'post_date_gmt', 'post_content', 'post_title', 'post_excerpt',
+    'post_status', 'comment_status', 'ping_status', 'post_password', 'post_name', 'to_ping', 'pinged',
+    'post_modified', 'post_modified_gmt', 'post_content_filtered', 'post_parent', 'guid', 'menu_order',
+    'post_type', 'post_mime_type', 'comment_count'
+)
+
+# wp_posts with any table prefix (wp_, wp_2_, custom) - but not wp_postmeta
+POSTS_TABLE_PATTERN = re.compile(r'^(?:\w+_)?posts$')
+TABLE_NAME_PATTERN = re.compile(r'^\w+$')
+
+def is_posts_table(name, table=None):
+    """True for the requested table, or for any <prefix>posts table when none is given"""
+    return name == table if table else bool(POSTS_TABLE_PATTERN.match(name))
+
+def _text(value):
+    """Database value as the text a JSON export would hold"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode('utf-8', errors='replace')
+    return str(value)
+
+# --- mysqldump -------------------------------------------------------------------------
+
+# Whitespace, comments and mysqldump's /*!40101 ... */; version comments between statements
+GAP_PATTERN = re.compile(r'(?:\s+|--[^\n]*\n|#[^\n]*\n|/\*.*?\*/;?)*', re.S)
+INSERT_PATTERN = re.compile(
+    r'(?:INSERT|REPLACE)\s+(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE)\s+)*INTO\s+'
+    r'(?:`?\w+`?\.)?`?(\w+)`?\s*(?:\(([^)]*)\)\s*)?VALUES\s*', re.I)
+CREATE_PATTERN = re.compile(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:`?\w+`?\.)?`?(\w+)`?\s*\(', re.I)
+# Statement text up to its ';' - quoted strings may contain ';'. Stops early at a quote cut off by the buffer end
+STATEMENT_BODY_PATTERN = re.compile(r'''[^;'"`]*(?:(?:'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'|"[^"\\]*(?:\\.[^"\\]*)*"|`[^`]*`)'''
+                                    r'''[^;'"`]*)*''', re.S)
+COLUMN_DEFINITION_PATTERN = re.compile(r'^\s*`([^`]+)`', re.M)
+ROW_START_PATTERN = re.compile(r'\s*\(')
+# One value and the ',' or ')' after it: quoted string (unrolled - post_content can be long),
+# _binary string, or a bare literal (number, NULL, 0x...)
+VALUE_PATTERN = re.compile(r"""\s*(?:'([^'\\]*(?:(?:\\.|'')[^'\\]*)*)'|_binary\s*'([^'\\]*(?:(?:\\.|'')[^'\\]*)*)'"""
+                           r"""|([^,)'\s]+))\s*([,)])""", re.S)
+ROW_END_PATTERN = re.compile(r'\s*([,;])')
+
+MYSQL_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+ESCAPE_PATTERN = re.compile(r"\\(.)|''", re.S)
+
+# Characters kept ahead of the parse position when matching statement headers
+LOOKAHEAD = 1 << 16
+
+def unescape_sql_string(value):
+    """Body of a MySQL string literal -> text (\\n, \\', '' and the other escapes mysqldump writes)"""
+    if '\\' not in value and "''" not in value:
+        return value
+    return ESCAPE_PATTERN.sub(lambda m: "'" if m.group(1) is None else MYSQL_ESCAPES.get(m.group(1), m.group(1)),
+                              value)
+
+class _SqlStream:
+    """Incremental reader over a SQL dump - patterns are matched on a buffer that grows as needed"""
+
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Reads the next chunk, dropping the already consumed part of the buffer"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def ensure(self, size):
+        """Reads until size characters are buffered ahead of the position (or the file ends)"""
+        while len(self.buf) - self.pos < size and self._fill():
+            pass
+
+    def match(self, pattern):
+        """Matches pattern at the position, reading more while the text may be cut off; consumes the match"""
+        while True:
+            m = pattern.match(self.buf, self.pos)
+            if m is not None and (m.end() < len(self.buf) or self.eof):
+                self.pos = m.end()
+                return m
+            if self.eof or not self._fill():
+                if m is not None:
+                    self.pos = m.end()
+                return m
+
+    def skip_gap(self):
+        """Skips whitespace and comments, returns False at the end of the file"""
+        while True:
+            self.ensure(LOOKAHEAD)
+            self.pos = GAP_PATTERN.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return True
+            if not self._fill():
+                return False
+
+    def statement(self, keep=False):
+        """Consumes the rest of a statement including its ';' - returns its text (keep=True) or '',
+        None if the file ends first. Large statements are skipped piece by piece, not buffered whole."""
+        parts = []
+        while True:
+            start = self.pos
+            self.pos = STATEMENT_BODY_PATTERN.match(self.buf, self.pos).end()
+            if keep:
+                parts.append(self.buf[start:self.pos])
+            if self.pos < len(self.buf) and self.buf[self.pos] == ';':
+                self.pos += 1
+                return ''.join(parts)
+            # Buffer end or a quoted string cut off by it
+            if not self._fill():
+                return None
+
+    def header(self, pattern):
+        """Matches a statement header (short, always within the lookahead)"""
+        m = pattern.match(self.buf, self.pos)
+        if m is not None:
+            self.pos = m.end()
+        return m
+
+def _iter_rows(stream, table):
+    """Value tuples of one INSERT statement - (...), (...), ...;"""
+    while True:
+        if stream.match(ROW_START_PATTERN) is None:
+            raise ValueError(f"Invalid INSERT into {table}: expected '(' near '{stream.buf[stream.pos:stream.pos + 40]}'")
+        row = []
+        while True:
+            m = stream.match(VALUE_PATTERN)
+            if m is None:
+                raise ValueError(f"Invalid value in INSERT into {table} near '{stream.buf[stream.pos:stream.pos + 40]}'")
+            quoted, binary, bare, end = m.groups()
+            if quoted is not None:
+                row.append(unescape_sql_string(quoted))
+            elif binary is not None:
+                row.append(unescape_sql_string(binary))
+            else:
+                row.append(None if bare.upper() == 'NULL' else bare)
+            if end == ')':
+                break
+        yield row
+        m = stream.match(ROW_END_PATTERN)
+        if m is None or m.group(1) == ';':
+            return
+
+def _open_dump(path, encoding):
+    """Plain or gzip-compressed dump as text - newline='' keeps raw line breaks inside strings"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding=encoding, newline='')
+    return open(path, 'r', encoding=encoding, newline='')
+
+def load_wp_posts_sql(file_path, table=None, chunk_size=1 << 20, encoding='utf-8'):
+    """Loads posts from a mysqldump file (.sql or .sql.gz) - yields records one at a time
+
+    Rows come from the INSERT statements of `table` (default: the first <prefix>posts table).
+    Column names are taken from the INSERT column list, else from the table's CREATE TABLE,
+    else the standard wp_posts order is assumed. Statements of other tables are skipped
+    without parsing their values, and reading stops once the table's data is done.
+    """
+    with _open_dump(file_path, encoding) as f:
+        stream = _SqlStream(f, chunk_size)
+        target = table
+        columns = None
+        rows_read = False
+
+        while stream.skip_gap():
+            m = stream.header(INSERT_PATTERN)
+            if m is not None:
+                name = m.group(1)
+                if target is None and is_posts_table(name):
+                    target = name
+                if name != target:
+                    if rows_read:
+                        return  # mysqldump writes one table after the other - the rest is other tables
+                    stream.statement()
+                    continue
+                names = re.findall(r'`?(\w+)`?', m.group(2)) if m.group(2) else columns or list(WP_POSTS_COLUMNS)
+                for row in _iter_rows(stream, name):
+                    if len(row) != len(names):
+                        raise ValueError(f"INSERT into {name} has {len(row)} values for {len(names)} columns - "
+                                         f"dump without CREATE TABLE and with a non-standard column order?")
+                    yield dict(zip(names, row))
+                rows_read = True
+                continue
+
+            m = stream.header(CREATE_PATTERN)
+            if m is None:
+                # Any other statement (SET, DROP TABLE, LOCK TABLES, ...)
+                if stream.statement() is None:
+                    return  # Trailing text without a closing ';'
+                continue
+            name = m.group(1)
+            if target is None and is_posts_table(name):
+                target = name
+            if name != target and rows_read:
+                return
+            definition = stream.statement(keep=name == target)
+            if definition:
+                columns = COLUMN_DEFINITION_PATTERN.findall(definition)
+
+# --- Databases -------------------------------------------------------------------------
+
+def _checked_table(table):
+    if not TABLE_NAME_PATTERN.match(table):
+        raise ValueError(f"Invalid table name: {table}")
+    return table
+
+def _iter_cursor(cursor, batch_size):
+    """Rows of an executed query as dicts - fetched batch_size at a time"""
+    names = [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield {name: _text(value) for name, value in zip(names, row)}
+
+def load_wp_posts_sqlite(db_path, table=None, batch_size=1000):
+    """Loads posts from a SQLite database (opened read-only) - yields records one at a time
+
+    table defaults to the first <prefix>posts table. SQLite steps through the result
+    as it is fetched, so the table is never held in memory.
+    """
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        if table is None:
+            names = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+            table = next((name for name in names if is_posts_table(name)), None)
+            if table is None:
+                raise ValueError(f"No wp_posts table in {db_path}")
+        cursor = connection.execute(f'SELECT * FROM "{_checked_table(table)}"')
+        yield from _iter_cursor(cursor, batch_size)
+    finally:
+        connection.close()
+
+def load_wp_posts_mysql(table=None, batch_size=1000, **connect_args):
+    """Loads posts from a MySQL/MariaDB server - yields records one at a time (requires pymysql)
+
+    connect_args go to pymysql.connect (host, port, user, password, database). Rows are
+    read over an unbuffered server-side cursor (SSCursor), so the client holds one batch at a time.
+    """
+    try:
+        import pymysql
+        import pymysql.cursors
+    except ImportError:
+        raise ImportError("Reading from MySQL requires pymysql: pip install pymysql")
+    connect_args.setdefault('charset', 'utf8mb4')
+    connection = pymysql.connect(**connect_args)
+    try:
+        if table is None:
+            with connection.cursor() as cursor:
+                cursor.execute("SHOW TABLES")
+                table = next((row[0] for row in cursor.fetchall() if is_posts_table(row[0])), None)
+            if table is None:
+                raise ValueError(f"No wp_posts table in database {connect_args.get('database')}")
+        with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(f"SELECT * FROM `{_checked_table(table)}`")
+            yield from _iter_cursor(cursor, batch_size)
+    finally:
+        connection.close()
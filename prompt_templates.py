@@ -0,0 +1,168 @@
+"""
+Prompt templates - static instructions first, variable fields last
+The instructions go into a system message that is identical for every request of a template,
+the image URL, template file, context and current alt follow in the user message.
+No prompt caching discount is expected: OpenAI caches prefixes of 1024+ tokens only, and the
+instructions are about 30 (description) to 360 tokens. The order only makes a longer prefix
+cacheable should the instructions ever grow past that.
+
+Bump a template's version when you change its text - cached results of the old version
+are no longer used.
+"""
+
+class PromptTemplate:
+    """Versioned prompt: static instructions + a str.format() template for the variable fields"""
+
+    def __init__(self, name, version, instructions, fields=""):
+        self.name = name
+        self.version = version
+        self.instructions = instructions
+        self.fields = fields
+
+    def render(self, **values):
+        """Variable part of the prompt"""
+        return self.fields.format(**values)
+
+    def messages(self, image=None, **values):
+        """Chat messages - system instructions, then the fields (and the image_url part, if any)"""
+        text = self.render(**values)
+        if image is None:
+            content = text
+        else:
+            content = ([{"type": "text", "text": text}] if text else []) + [{"type": "image_url", "image_url": image}]
+        return [
+            {"role": "system", "content": self.instructions},
+            {"role": "user", "content": content}
+        ]
+
+# Shared by all alt text templates
+REQUIREMENTS = """REQUIREMENTS:
+- Maximum 125 characters
+- Be descriptive and helpful for accessibility
+- Don't use words like "image", "picture", "photo"
+- For logos: include company/organization name
+- For icons: describe the function/meaning
+- For people: include name and title if identifiable from context
+- For decorative elements: consider if alt should be empty"""
+
+IMAGE_FIELDS = """IMAGE URL: {img_url}
+PHP TEMPLATE FILE: {php_file}
+CURRENT ALT TEXT: "{current_alt}" (empty if none)
+"""
+
+CONTEXT_FIELDS = """CODE CONTEXT around the image tag:
+```php
+{context}
+```"""
+
+DESCRIPTION = PromptTemplate("description", "2", (
+    "What's in this image? Describe what you see in detail. "
+    "Focus on the main elements, colors, text, people, objects, and overall composition."
+))
+
+TWO_STEP = PromptTemplate("two_step", "2", f"""You are creating an alt text for an image in a WordPress PHP template file.
+The user message gives the image URL, the template file, the current alt text, a detailed description of the image and the code around the image tag.
+
+INSTRUCTIONS:
+- Use the detailed image description and code context to create the perfect alt text
+- This image is part of a website template (header, footer, layout elements)
+- Consider if it's a logo, icon, decorative element, or content image
+- **If the image shows a person, try to identify them from the page context (text, names mentioned)**
+- **For people: include their name and title/role if mentioned in the context**
+
+{REQUIREMENTS}
+- Be specific and contextual
+
+EXAMPLE: If you see a person and context mentions "Dr. Jane Smith, Professor of Medicine"
+→ Alt text: "Dr. Jane Smith, Professor of Medicine, in professional portrait"
+
+RESPONSE: Provide only the alt text, nothing else. If the image is purely decorative, respond with "DECORATIVE".""",
+    IMAGE_FIELDS + "\nDETAILED IMAGE DESCRIPTION:\n{image_description}\n\n" + CONTEXT_FIELDS)
+
+ONE_STEP_VISION = PromptTemplate("one_step_vision", "2", f"""You are creating an alt text for an image found in a WordPress PHP template file.
+The user message gives the image URL, the template file, the current alt text and the code around the image tag, followed by the image.
+
+INSTRUCTIONS:
+- Look at the image and understand what it shows
+- This image is part of the website template (header, footer, layout elements)
+- Consider if it's a logo, icon, decorative element, or content image
+- The context shows where in the PHP template this image appears
+- **If the image shows a person, try to identify them from the page context (text, names mentioned)**
+- **For people: include their name and title/role if mentioned in the context**
+
+{REQUIREMENTS}
+- Be specific and contextual
+
+EXAMPLE: If you see a person and context mentions "Dr. Jane Smith, Professor of Medicine"
+→ Alt text: "Dr. Jane Smith, Professor of Medicine, in professional portrait"
+
+RESPONSE: Provide only the alt text, nothing else. If the image is purely decorative, respond with "DECORATIVE".""",
+    IMAGE_FIELDS + "\n" + CONTEXT_FIELDS)
+
+TEXT_ONLY = PromptTemplate("text_only", "2", f"""You are creating an alt text for an image found in a WordPress PHP template file.
+The user message gives the image URL, the template file, the current alt text and the code around the image tag.
+
+INSTRUCTIONS:
+- Based on the image URL and context, create an appropriate alt text
+- This image is part of the website template (header, footer, layout elements)
+- Consider if it's a logo, icon, decorative element, or content image
+- Look at the filename and path for clues about the image content
+- The context shows where in the PHP template this image appears
+- **If the context suggests the image shows a person, try to identify them from the text**
+- **For people: include their name and title/role if mentioned in the context**
+
+{REQUIREMENTS}
+- Be specific and contextual based on filename and context
+
+EXAMPLE: If filename is "dr-smith-portrait.jpg" and context mentions "Dr. Jane Smith, Professor"
+→ Alt text: "Dr. Jane Smith, Professor of Medicine, in professional portrait"
+
+RESPONSE: Provide only the alt text, nothing else. If the image is purely decorative, respond with "DECORATIVE".""",
+    IMAGE_FIELDS + "\n" + CONTEXT_FIELDS)
+
+# Approach 3, several images per request - the item count is part of the variable fields
+PACKED_TEXT_ONLY = PromptTemplate("packed_text_only", "2", f"""You are creating alt texts for images found in WordPress PHP template files.
+The user message lists the images as "### ITEM <number>" blocks, each with the image URL, the template file, the current alt text and the code around the image tag.
+
+INSTRUCTIONS (for every item):
+- Based on the image URL and context, create an appropriate alt text
+- The images are part of the website template (header, footer, layout elements)
+- Consider if it's a logo, icon, decorative element, or content image
+- Look at the filename and path for clues about the image content
+- The context shows where in the PHP template the image appears
+- **If the context suggests the image shows a person, try to identify them from the text**
+- **For people: include their name and title/role if mentioned in the context**
+- Treat every item on its own - do not mix up contexts of different items
+
+{REQUIREMENTS}
+- Be specific and contextual based on filename and context
+
+EXAMPLE: If filename is "dr-smith-portrait.jpg" and context mentions "Dr. Jane Smith, Professor"
+→ Alt text: "Dr. Jane Smith, Professor of Medicine, in professional portrait"
+
+RESPONSE: A JSON object mapping every item number to its alt text, e.g. {{"1": "...", "2": "DECORATIVE"}}.
+Use "DECORATIVE" for purely decorative images. No other keys, no comments.""",
+    "{count} images:\n\n{items}")
+
+PACKED_ITEM = "### ITEM {item_id}\n" + IMAGE_FIELDS + CONTEXT_FIELDS
+
+# Alt text template per approach (approach 3 packed requests use PACKED_TEXT_ONLY)
+APPROACH_TEMPLATES = {1: TWO_STEP, 2: ONE_STEP_VISION, 3: TEXT_ONLY}
+
+TEMPLATES = {template.name: template for template in (DESCRIPTION, TWO_STEP, ONE_STEP_VISION, TEXT_ONLY, PACKED_TEXT_ONLY)}
+TEMPLATE_NAMES = {template.instructions: template.name for template in TEMPLATES.values()}
+
+def template_name(messages):
+    """Name of the template a request's messages were built from ("other" if none)"""
+    if messages and messages[0].get("role") == "system":
+        return TEMPLATE_NAMES.get(messages[0].get("content"), "other")
+    return "other"
+
+def prompt_version(approach):
+    """Version of the approach's alt text prompt - part of the result cache key
+
+    Approach 3 results are shared by packed and single requests, so both versions count.
+    """
+    if approach == 3:
+        return f"{TEXT_ONLY.version}.{PACKED_TEXT_ONLY.version}"
+    return APPROACH_TEMPLATES[approach].version
@@ -0,0 +1,177 @@
+"""
+Rate limiter - token buckets for requests-per-minute and tokens-per-minute budgets per model
+"""
+
+import asyncio
+import time
+
+from openai import RateLimitError
+
+# Default budgets (OpenAI usage tier 1) - override with your tier's limits
+MODEL_LIMITS = {
+    "gpt-4o-mini": {"rpm": 500, "tpm": 200000},
+    "gpt-4o": {"rpm": 500, "tpm": 30000},
+}
+
+# Prompt token estimate for one image input (a high-detail image is 765-1105 tokens, low detail is 85)
+IMAGE_TOKENS = 1000
+LOW_DETAIL_IMAGE_TOKENS = 85
+# Completion allowance per request (alt texts are short)
+COMPLETION_TOKENS = 100
+
+def estimate_request_tokens(messages, max_tokens=None):
+    """Estimates tokens a request counts against TPM before it is sent (~4 characters per token)"""
+    chars = 0
+    image_tokens = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                chars += len(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                low = part.get("image_url", {}).get("detail") == "low"
+                image_tokens += LOW_DETAIL_IMAGE_TOKENS if low else IMAGE_TOKENS
+    return chars // 4 + image_tokens + (max_tokens or COMPLETION_TOKENS)
+
+def retry_after_seconds(error):
+    """Reads Retry-After (or retry-after-ms) from an API error response, None if absent"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+class TokenBucket:
+    """Bucket of capacity units refilled continuously at capacity per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount is available (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """Corrects an earlier estimate - positive charges more, negative refunds"""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+class RateLimiter:
+    """Shared RPM + TPM limiter, one pair of buckets per model
+
+    Requests for the same model wait in FIFO order. A 429 pauses the model
+    for the server's Retry-After period.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(MODEL_LIMITS, **(limits or {}))
+        self.requests = {}
+        self.tokens = {}
+        self.locks = {}
+        self.paused_until = {}
+        self.stats = {"requests": 0, "rate_limited": 0, "waited_seconds": 0.0}
+
+    def _model(self, model):
+        if model not in self.locks:
+            limits = self.limits.get(model, {"rpm": 500, "tpm": 30000})
+            self.requests[model] = TokenBucket(limits["rpm"])
+            self.tokens[model] = TokenBucket(limits["tpm"])
+            self.locks[model] = asyncio.Lock()
+            self.paused_until[model] = 0.0
+        return self.locks[model]
+
+    async def acquire(self, model, tokens):
+        """Waits until one request and `tokens` tokens fit into the model's budget"""
+        async with self._model(model):
+            while True:
+                wait = max(
+                    self.paused_until[model] - time.monotonic(),
+                    self.requests[model].wait_time(1),
+                    self.tokens[model].wait_time(tokens),
+                )
+                if wait <= 0:
+                    break
+                self.stats["waited_seconds"] += wait
+                await asyncio.sleep(wait)
+            self.requests[model].consume(1)
+            self.tokens[model].consume(tokens)
+            self.stats["requests"] += 1
+
+    def record_usage(self, model, estimated, actual):
+        """Replaces the pre-send estimate with the usage reported by the API"""
+        self._model(model)
+        self.tokens[model].adjust(actual - estimated)
+
+    def pause(self, model, seconds):
+        """Stops dispatch for the model (e.g. after a 429 with Retry-After)"""
+        self._model(model)
+        self.stats["rate_limited"] += 1
+        self.paused_until[model] = max(self.paused_until[model], time.monotonic() + seconds)
+
+class RateLimitedClient:
+    """Wraps an AsyncOpenAI client - chat.completions.create goes through the limiter
+
+    Drop-in for the approach_* functions, which only call client.chat.completions.create.
+    429 responses pause the model for Retry-After (or exponential backoff) and are retried up to
+    max_retries times. With max_retries=0 the error is passed on after the pause (see resilience.py).
+    """
+
+    def __init__(self, client, limiter, max_retries=5):
+        self.client = client
+        self.limiter = limiter
+        self.max_retries = max_retries
+        # Same call path as the OpenAI client: client.chat.completions.create(...)
+        self.chat = self
+        self.completions = self
+
+    async def acquire(self, **kwargs):
+        """Waits until the request fits into the budget - returns the token estimate for send()"""
+        estimated = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens"))
+        await self.limiter.acquire(kwargs["model"], estimated)
+        return estimated
+
+    async def send(self, estimated, attempt=0, **kwargs):
+        """Sends a request whose budget was acquired - the API call only, no waiting for budget"""
+        model = kwargs["model"]
+        try:
+            response = await self.client.chat.completions.create(**kwargs)
+        except RateLimitError as e:
+            # Other requests for the model wait too, also when the error is passed on
+            self.limiter.pause(model, retry_after_seconds(e) or 2 ** attempt)
+            raise
+
+        usage = getattr(response, "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", None):
+            self.limiter.record_usage(model, estimated, usage.total_tokens)
+        return response
+
+    async def create(self, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            estimated = await self.acquire(**kwargs)
+            try:
+                return await self.send(estimated, attempt, **kwargs)
+            except RateLimitError:
+                if attempt == self.max_retries:
+                    raise
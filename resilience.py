@@ -0,0 +1,201 @@
+"""
+Resilience - retries with backoff, error classification, request timeouts and a circuit breaker
+Transient API failures (429, 5xx, timeouts, dropped connections) are retried instead of
+ending up as ERROR rows. When the API keeps failing, the circuit breaker pauses dispatch
+for all requests until a probe request succeeds again.
+"""
+
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+import openai
+
+from rate_limiter import retry_after_seconds
+from run_metrics import log
+
+# Error classes
+RATE_LIMITED = "rate_limited"
+RETRYABLE = "retryable"
+FATAL = "fatal"
+
+# HTTP statuses worth another attempt (besides 429 and 5xx)
+RETRYABLE_STATUSES = (408, 409)
+
+class RequestTimeout(Exception):
+    """The request took longer than the per-request timeout"""
+
+def classify_error(error):
+    """Returns RATE_LIMITED, RETRYABLE or FATAL for an exception raised by an API call
+
+    Quota errors come back as 429 too, but waiting does not help - they are fatal.
+    """
+    if isinstance(error, openai.RateLimitError):
+        code = getattr(error, "code", None) or ""
+        return FATAL if code == "insufficient_quota" else RATE_LIMITED
+    if isinstance(error, (RequestTimeout, asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+        return RETRYABLE
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        return RETRYABLE if status >= 500 or status in RETRYABLE_STATUSES else FATAL
+    return FATAL
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter - random between 0 and base * 2^attempt (at most cap)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class CircuitBreaker:
+    """Stops dispatch while the API is degraded
+
+    closed: requests go through. After failure_threshold consecutive transient failures
+    the breaker opens: nobody is dispatched for reset_timeout seconds. Then it is half-open:
+    one probe request goes through - success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        # waited_seconds: time dispatch was paused, counted once per pause (not per waiting request)
+        self.stats = {"opened": 0, "waited_seconds": 0.0}
+
+    async def wait(self):
+        """Returns when a request may be dispatched"""
+        while self.state != "closed":
+            if self.state == "open":
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining <= 0:
+                    # This caller is the probe - the pause is over
+                    self.state = "half_open"
+                    self.stats["waited_seconds"] += time.monotonic() - self.opened_at
+                    return
+                wait = remaining
+            else:
+                # Probe in flight - check again shortly
+                wait = min(1.0, self.reset_timeout)
+            await asyncio.sleep(wait)
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        """Counts one transient failure (rate limits and fatal errors are not counted)"""
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            if self.state == "closed":
+                log(f"    API degraded ({self.failures} failures in a row) - pausing dispatch for {self.reset_timeout:.0f}s")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.stats["opened"] += 1
+
+class ResilientClient:
+    """Wraps a chat client (AsyncOpenAI or RateLimitedClient) - same call path,
+    client.chat.completions.create(...)
+
+    Each attempt is limited to `timeout` seconds of API time - with a RateLimitedClient the
+    budget is acquired first, so waiting for the rate limiter never counts as a timeout
+    (and never trips the circuit breaker). Rate limits and transient errors are
+    retried up to max_retries times with jittered exponential backoff (rate limits after
+    Retry-After when the server sends it). Fatal errors (bad request, authentication,
+    quota) are raised right away.
+    """
+
+    def __init__(self, client, breaker=None, max_retries=4, timeout=60.0, backoff_base=1.0, backoff_cap=60.0):
+        self.client = client
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.stats = {"retries": 0, "timeouts": 0, "failed": 0}
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            if self.breaker is not None:
+                await self.breaker.wait()
+            try:
+                if hasattr(self.client, "acquire"):
+                    estimated = await self.client.acquire(**kwargs)
+                    call = self.client.send(estimated, attempt, **kwargs)
+                else:
+                    call = self.client.chat.completions.create(**kwargs)
+                response = await asyncio.wait_for(call, self.timeout)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                    e = RequestTimeout(f"no response within {self.timeout:.0f}s")
+                kind = classify_error(e)
+                if kind == RETRYABLE and self.breaker is not None:
+                    self.breaker.record_failure()
+                if kind == FATAL or attempt == self.max_retries:
+                    self.stats["failed"] += 1
+                    raise e
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                if kind == RATE_LIMITED:
+                    delay = retry_after_seconds(e) or delay
+                self.stats["retries"] += 1
+                log(f"    Retrying in {delay:.1f}s ({type(e).__name__}, attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+                continue
+
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return response
+
+def api_error(status, message="injected failure", headers=None, code=None):
+    """openai.APIStatusError subclass for an HTTP status, as the SDK raises it"""
+    import httpx
+
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    body = {"message": message, "code": code}
+    error_class = {
+        400: openai.BadRequestError,
+        401: openai.AuthenticationError,
+        403: openai.PermissionDeniedError,
+        404: openai.NotFoundError,
+        409: openai.ConflictError,
+        422: openai.UnprocessableEntityError,
+        429: openai.RateLimitError,
+    }.get(status, openai.InternalServerError if status >= 500 else openai.APIStatusError)
+    return error_class(message, response=response, body=body)
+
+class FaultInjectingClient:
+    """Fake async chat client that fails on cue - for trying the resilience layer offline
+
+    failures: sequence consumed one entry per call - None answers, an int raises the
+    API error for that HTTP status, "timeout" hangs longer than any timeout, "connection"
+    raises a connection error, an exception instance is raised as is. Calls after
+    the end of the sequence answer. respond(kwargs) builds the answer text.
+    """
+
+    def __init__(self, failures=(), respond=None, latency=0.0):
+        self.failures = list(failures)
+        self.respond = respond or (lambda kwargs: "Injected alt text")
+        self.latency = latency
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        failure = self.failures[self.calls] if self.calls < len(self.failures) else None
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if failure == "timeout":
+            await asyncio.sleep(3600)
+        elif failure == "connection":
+            import httpx
+            raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+        elif isinstance(failure, int):
+            raise api_error(failure)
+        elif isinstance(failure, Exception):
+            raise failure
+
+        message = SimpleNamespace(role="assistant", content=self.respond(kwargs))
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")], usage=None)
@@ -0,0 +1,263 @@
+"""
+Run metrics - request latency, tokens and cost per run, a JSON run report and a progress line
+Token counts come from response.usage, cost from PRICES (USD per 1M tokens).
+"""
+
+import json
+import math
+import sys
+import time
+from contextlib import contextmanager
+
+from prompt_templates import template_name
+from rate_limiter import estimate_request_tokens
+
+# USD per 1M tokens - input, cached input, output (platform.openai.com/docs/pricing)
+PRICES = {
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+}
+
+# Completion tokens assumed by cost estimates (alt texts and descriptions are short)
+ESTIMATED_COMPLETION_TOKENS = {"description": 150, "alt_text": 30}
+
+def usage_value(usage, name, default=0):
+    """Field of a usage object (SDK response) or dict (Batch API output), default if missing"""
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return default if value is None else value
+
+def token_cost(model, prompt_tokens, completion_tokens, cached_tokens=0, prices=None):
+    """Cost in USD - cached prompt tokens are billed at the cached input price"""
+    price = (prices or PRICES).get(model)
+    if price is None:
+        return 0.0
+    return ((prompt_tokens - cached_tokens) * price["input"] + cached_tokens * price["cached_input"] +
+            completion_tokens * price["output"]) / 1_000_000
+
+def estimate_request_cost(request, completion_tokens, prices=None):
+    """Cost estimate of a request body before it is sent (prompt tokens at ~4 characters per token)"""
+    prompt_tokens = estimate_request_tokens(request["messages"], 0)
+    return token_cost(request["model"], prompt_tokens, completion_tokens, prices=prices)
+
+def percentile(values, p):
+    """p-th percentile (nearest rank) of a list of numbers, None for an empty list"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+class RunMetrics:
+    """Collects one run's timings, tokens and costs
+
+    Requests are grouped by prompt template (description, two_step, one_step_vision,
+    text_only, packed_text_only) - for approach 1 that is one group per step.
+    Stages are wall times measured with timer(), e.g. queue wait and per-item time.
+    price_factor scales the cost (0.5 for the Batch API).
+    """
+
+    def __init__(self, prices=None, price_factor=1.0):
+        self.prices = prices or PRICES
+        self.price_factor = price_factor
+        self.started = time.time()
+        self.finished = None
+        self.stages = {}
+        self.requests = {}
+        self.counts = {}
+
+    def _group(self, template, model):
+        key = f"{template}/{model}"
+        if key not in self.requests:
+            self.requests[key] = {"template": template, "model": model, "requests": 0, "errors": 0, "latencies": [],
+                                  "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        return self.requests[key]
+
+    def add_time(self, stage, seconds):
+        self.stages.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def record_request(self, model, template, seconds=None, usage=None, error=False):
+        """One API call - latency (None for batch requests) and the usage it reported"""
+        group = self._group(template, model)
+        group["requests"] += 1
+        if error:
+            group["errors"] += 1
+        if seconds is not None:
+            group["latencies"].append(seconds)
+        if usage is not None:
+            group["prompt_tokens"] += usage_value(usage, "prompt_tokens")
+            group["completion_tokens"] += usage_value(usage, "completion_tokens")
+            group["cached_tokens"] += usage_value(usage_value(usage, "prompt_tokens_details", None) or {},
+                                                  "cached_tokens")
+
+    def finish(self):
+        self.finished = time.time()
+
+    def cost(self):
+        return sum(token_cost(group["model"], group["prompt_tokens"], group["completion_tokens"],
+                              group["cached_tokens"], self.prices)
+                   for group in self.requests.values()) * self.price_factor
+
+    def report(self, **extra):
+        """Run report as a JSON-serializable dict (extra keys are added at the top level)"""
+        duration = (self.finished or time.time()) - self.started
+        latencies = [seconds for group in self.requests.values() for seconds in group["latencies"]]
+        totals = {name: sum(group[name] for group in self.requests.values())
+                  for name in ("requests", "errors", "prompt_tokens", "completion_tokens", "cached_tokens")}
+        groups = []
+        for group in self.requests.values():
+            groups.append({
+                **{key: value for key, value in group.items() if key != "latencies"},
+                "latency_p50": percentile(group["latencies"], 50),
+                "latency_p95": percentile(group["latencies"], 95),
+                "latency_p99": percentile(group["latencies"], 99),
+                "cost_usd": token_cost(group["model"], group["prompt_tokens"], group["completion_tokens"],
+                                       group["cached_tokens"], self.prices) * self.price_factor
+            })
+        stages = {stage: {"count": len(times), "total_seconds": sum(times), "mean_seconds": sum(times) / len(times),
+                          "p95_seconds": percentile(times, 95)}
+                  for stage, times in self.stages.items()}
+        return {
+            **extra,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "duration_seconds": duration,
+            "totals": {
+                **totals,
+                "cache_hit_ratio": totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0,
+                "cost_usd": self.cost(),
+                "latency_p50": percentile(latencies, 50),
+                "latency_p95": percentile(latencies, 95),
+                "latency_p99": percentile(latencies, 99)
+            },
+            "counts": dict(self.counts),
+            "requests": groups,
+            "stages": stages
+        }
+
+    def write_report(self, path, **extra):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(**extra), f, indent=2, ensure_ascii=False)
+        return path
+
+    def statistics_rows(self):
+        """(metric, value) rows for the Statistics sheet"""
+        report = self.report()
+        totals = report["totals"]
+        rows = [
+            ("API requests", totals["requests"]),
+            ("API errors", totals["errors"]),
+            ("Prompt tokens", totals["prompt_tokens"]),
+            ("Cached prompt tokens", f"{totals['cached_tokens']} ({totals['cache_hit_ratio']:.0%})"),
+            ("Completion tokens", totals["completion_tokens"]),
+            ("Cost (USD)", f"{totals['cost_usd']:.4f}"),
+        ]
+        if totals["latency_p50"] is not None:
+            rows.append(("API latency p50 / p95 / p99 (s)",
+                         f"{totals['latency_p50']:.2f} / {totals['latency_p95']:.2f} / {totals['latency_p99']:.2f}"))
+        for group in report["requests"]:
+            rows.append((f"Requests {group['template']} ({group['model']})",
+                         f"{group['requests']}, {group['prompt_tokens'] + group['completion_tokens']} tokens, "
+                         f"${group['cost_usd']:.4f}"))
+        for stage, times in report["stages"].items():
+            rows.append((f"Stage {stage} (s)", f"{times['total_seconds']:.1f} total, {times['mean_seconds']:.2f} mean, "
+                                               f"{times['p95_seconds']:.2f} p95"))
+        return rows
+
+class MeteredClient:
+    """Wraps a chat client - records latency and usage of every call in RunMetrics
+
+    Sits directly on the AsyncOpenAI client, so latencies are pure API time
+    (rate limiter and retry waits are not included).
+    """
+
+    def __init__(self, client, metrics):
+        self.client = client
+        self.metrics = metrics
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        template = template_name(kwargs["messages"])
+        start = time.perf_counter()
+        try:
+            response = await self.client.chat.completions.create(**kwargs)
+        except Exception:
+            self.metrics.record_request(kwargs["model"], template, time.perf_counter() - start, error=True)
+            raise
+        self.metrics.record_request(kwargs["model"], template, time.perf_counter() - start,
+                                    getattr(response, "usage", None))
+        return response
+
+# Progress line currently drawn - log() writes through it
+_active_progress = None
+
+def log(text):
+    """Prints a line from anywhere in a run (retries, prefetch failures) without garbling the progress line"""
+    if _active_progress is not None:
+        _active_progress.message(text)
+    else:
+        print(text)
+
+class ProgressLine:
+    """Throttled progress line - done/total, successes, throughput and ETA
+
+    Redrawn in place at most every `interval` seconds on a terminal, printed as a new
+    line every `interval` seconds otherwise (logs, CI). Until close(), log() messages
+    go through it.
+    """
+
+    def __init__(self, total, label="", interval=1.0, stream=None):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.inline = getattr(self.stream, "isatty", lambda: False)()
+        self.done = 0
+        self.successful = 0
+        self.started = time.monotonic()
+        self.printed = 0.0
+        global _active_progress
+        _active_progress = self
+
+    def update(self, done=1, successful=0):
+        self.done += done
+        self.successful += successful
+        now = time.monotonic()
+        if now - self.printed >= self.interval or self.done >= self.total:
+            self.printed = now
+            self._draw(now)
+
+    def message(self, text):
+        """Prints a line (e.g. an error) without garbling the progress line"""
+        if self.inline:
+            self.stream.write("\r\033[K")
+        print(text, file=self.stream)
+
+    def _draw(self, now):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        line = (f"{self.label}[{self.done}/{self.total}] {self.successful} successful, "
+                f"{rate:.1f}/s, ETA {int(eta // 60)}:{int(eta % 60):02d}")
+        if self.inline:
+            self.stream.write(f"\r\033[K{line}")
+            self.stream.flush()
+        else:
+            print(line, file=self.stream)
+
+    def close(self):
+        global _active_progress
+        if _active_progress is self:
+            _active_progress = None
+        if self.inline and self.printed:
+            self.stream.write("\n")
+            self.stream.flush()
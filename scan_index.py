@@ -0,0 +1,107 @@
+"""
+Scan index - persistent SQLite fingerprints of scanned posts for incremental re-scans
+"""
+
+import hashlib
+import json
+import sqlite3
+
+class ScanIndex:
+    """Maps post ID -> fingerprint (post_modified + content hash) and the images extracted from it
+
+    Posts whose fingerprint is unchanged are served from the index instead of being re-parsed.
+    Changes are staged during the scan and committed by finish(), so an interrupted
+    run leaves the previous index intact.
+    """
+
+    def __init__(self, path, config_key=''):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                images TEXT NOT NULL,
+                post_row TEXT
+            );
+        """)
+        self.stats = {'unchanged': 0, 'added': 0, 'changed': 0, 'removed': 0}
+        self.delta = []
+        self.seen = set()
+
+        # Different scan settings (base URL, context size) produce different rows - start over
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        self.reset = row is not None and row[0] != config_key
+        if self.reset:
+            self.conn.execute("DELETE FROM posts")
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('config', ?)", (config_key,))
+
+    @staticmethod
+    def fingerprint(post):
+        """post_modified plus a hash of everything that ends up in the image rows"""
+        digest = hashlib.sha1()
+        for field in ('post_title', 'post_name', 'post_type', 'post_content'):
+            digest.update(str(post.get(field, '')).encode('utf-8'))
+            digest.update(b'\0')
+        return f"{post.get('post_modified', '')}|{digest.hexdigest()}"
+
+    def check(self, post):
+        """Returns (state, fingerprint, cached)
+
+        state is 'unchanged', 'changed' or 'added'; cached is (images, post_row)
+        for unchanged posts and None otherwise.
+        """
+        post_id = str(post.get('ID'))
+        fingerprint = self.fingerprint(post)
+        self.seen.add(post_id)
+
+        row = self.conn.execute(
+            "SELECT fingerprint, images, post_row FROM posts WHERE post_id = ?", (post_id,)
+        ).fetchone()
+        if row is None:
+            return 'added', fingerprint, None
+        if row[0] != fingerprint:
+            return 'changed', fingerprint, None
+
+        self.stats['unchanged'] += 1
+        return 'unchanged', fingerprint, (json.loads(row[1]), json.loads(row[2]) if row[2] else None)
+
+    def record(self, post_id, fingerprint, state, images, post_row):
+        """Stores the scan result of an added/changed post and adds its images to the delta
+
+        For a changed post the images it no longer has go to the delta as removed.
+        """
+        if state == 'changed':
+            (previous,) = self.conn.execute("SELECT images FROM posts WHERE post_id = ?", (str(post_id),)).fetchone()
+            # Offsets move when text before an image is edited, so the tag alone also counts as present
+            present = {(image['img_src'], image['img_offset']) for image in images}
+            tags = {image['full_img_tag'] for image in images}
+            self.delta.extend(
+                dict(image, change='removed') for image in json.loads(previous)
+                if (image['img_src'], image['img_offset']) not in present and image['full_img_tag'] not in tags
+            )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO posts (post_id, fingerprint, images, post_row) VALUES (?, ?, ?, ?)",
+            (str(post_id), fingerprint, json.dumps(images), json.dumps(post_row) if post_row else None)
+        )
+        self.stats[state] += 1
+        self.delta.extend(dict(image, change=state) for image in images)
+
+    def finish(self):
+        """Drops posts missing from this export (deleted or no longer public) and commits
+
+        Returns the delta - image rows tagged with change = added/changed/removed.
+        """
+        removed = [post_id for (post_id,) in self.conn.execute("SELECT post_id FROM posts") if post_id not in self.seen]
+        for post_id in removed:
+            (images,) = self.conn.execute("SELECT images FROM posts WHERE post_id = ?", (post_id,)).fetchone()
+            self.delta.extend(dict(image, change='removed') for image in json.loads(images))
+            self.conn.execute("DELETE FROM posts WHERE post_id = ?", (post_id,))
+        self.stats['removed'] = len(removed)
+
+        self.conn.commit()
+        return self.delta
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,54 @@
+"""Approach 1 with the description cache, image prefetch and clustering - offline"""
+
+import asyncio
+
+import multi_approach_alt_generator as generator
+from alt_text_cache import AltTextCache
+from image_prefetch import ImageClusters
+from resilience import FaultInjectingClient
+
+BASE = "https://example.com/wp-content/uploads/"
+
+class RecordingPrefetcher:
+    """Stands in for ImagePrefetcher - records which URLs were fetched"""
+
+    def __init__(self):
+        self.fetched = []
+
+    async def fetch(self, img_url):
+        self.fetched.append(img_url)
+        return {"url": f"data:image/jpeg;base64,{len(self.fetched)}", "detail": "low",
+                "hash": "0" * 16}
+
+def describe_all(urls, cache, prefetcher, clusters, client):
+    async def run():
+        return [await generator.approach_1_two_step(client, url, "/post/", "Context", "", 0, cache, prefetcher,
+                                                    clusters) for url in urls]
+    return asyncio.run(run())
+
+def description_key(img_url):
+    return AltTextCache.description_key(img_url, generator.DESCRIPTION_MODEL, generator.DESCRIPTION.version)
+
+def test_cached_description_is_not_fetched(tmp_path):
+    cache = AltTextCache(str(tmp_path / "cache.sqlite"))
+    cache.put_description(description_key(BASE + "photo.jpg"), "A red bike")
+    prefetcher = RecordingPrefetcher()
+    client = FaultInjectingClient()
+    result, = describe_all([BASE + "photo.jpg"], cache, prefetcher, ImageClusters(), client)
+    assert result["image_description"] == "A red bike"
+    assert prefetcher.fetched == []
+    assert client.calls == 1  # alt text step only
+    cache.close()
+
+def test_size_variants_are_described_once_without_fetching(tmp_path):
+    cache = AltTextCache(str(tmp_path / "cache.sqlite"))
+    prefetcher = RecordingPrefetcher()
+    client = FaultInjectingClient()
+    urls = [BASE + "photo.jpg", BASE + "photo-300x200.jpg", BASE + "photo-scaled.jpg"]
+    results = describe_all(urls, cache, prefetcher, ImageClusters(), client)
+    assert all(result["success"] for result in results)
+    assert prefetcher.fetched == [BASE + "photo.jpg"]
+    assert client.calls == 1 + len(urls)  # one description, an alt text per image
+    # Every variant finds the description under its own URL in the next run
+    assert all(cache.get_description(description_key(url)) == results[0]["image_description"] for url in urls)
+    cache.close()
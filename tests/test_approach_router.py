@@ -0,0 +1,77 @@
+"""Routing rules of the approach router"""
+
+import pandas as pd
+import pytest
+
+from approach_router import CHROME_TEMPLATE_PATTERN, classify_image, filename_words, is_template_path, route_images
+
+LONG_CONTEXT = " ".join(["word"] * 40)
+PHOTO = "https://example.com/wp-content/uploads/2024/05/IMG_4711.jpg"
+
+@pytest.mark.parametrize("php_file", [
+    "wp-content/themes/shop/header.php",
+    "wp-content/themes/shop/footer.php",
+    "template-parts/header/site-branding.php",
+    "template-parts/nav-main.php",
+    "parts\\sidebar.php",
+    "inc/widget_recent.php",
+    "searchform.php",
+])
+def test_chrome_templates(php_file):
+    assert CHROME_TEMPLATE_PATTERN.search(php_file)
+    assert classify_image(PHOTO, php_file, LONG_CONTEXT) == (3, 'template chrome (header/footer/navigation)')
+
+@pytest.mark.parametrize("php_file", [
+    "/navy-blue-sofa/",
+    "/our-new-menu/",
+    "/headers-and-footers-explained/",
+    "/sidebarista/",
+    "template-parts/navigator.php",
+    "page-menus.php",
+])
+def test_not_chrome_templates(php_file):
+    assert classify_image(PHOTO, php_file, LONG_CONTEXT) == (2, 'content image')
+
+def test_pattern_matches_whole_name_parts():
+    assert CHROME_TEMPLATE_PATTERN.search("template-parts/nav-main.php")
+    assert CHROME_TEMPLATE_PATTERN.search("/navy-blue-sofa/") is None
+    assert CHROME_TEMPLATE_PATTERN.search("page-menus.php") is None
+
+@pytest.mark.parametrize("post_url", [
+    "https://example.com/our-new-menu/",
+    "/header-images-guide/",
+    "https://example.com/header-images-guide/",
+    "http://example.com/blog/footer/",
+])
+def test_post_urls_are_content(post_url):
+    assert classify_image(PHOTO, post_url, LONG_CONTEXT) == (2, 'content image')
+
+def test_template_paths():
+    assert is_template_path("wp-content/themes/shop/header.php")
+    assert not is_template_path("https://example.com/header.php")
+    assert not is_template_path("/our-new-menu/")
+    assert not is_template_path("")
+
+def test_filename_words_drop_wordpress_suffixes():
+    assert filename_words("https://example.com/uploads/red-bike-park-300x200.jpg") == ['red', 'bike', 'park']
+    assert filename_words("https://example.com/uploads/red-bike-park-scaled-e1612345678901.jpg") == ['red', 'bike', 'park']
+
+@pytest.mark.parametrize("img_url, approach, reason", [
+    ("https://example.com/uploads/spacer.gif", 3, 'decorative filename'),
+    ("https://example.com/uploads/company-logo.png", 3, 'logo/icon'),
+    ("https://example.com/uploads/arrow.svg", 3, 'decorative filename'),
+    ("https://example.com/icons/check.png", 3, 'logo/icon'),
+    ("https://example.com/uploads/red-mountain-bike-park-300x200.jpg", 3, 'descriptive filename'),
+])
+def test_classification(img_url, approach, reason):
+    assert classify_image(img_url, "https://example.com/post/", LONG_CONTEXT) == (approach, reason)
+
+def test_existing_alt_and_thin_context():
+    assert classify_image(PHOTO, "", LONG_CONTEXT, "Red mountain bike on a forest trail") == (3, 'existing alt text')
+    assert classify_image(PHOTO, "", "Short caption") == (1, 'content image, thin context')
+
+def test_route_images_columns():
+    df = pd.DataFrame([{"src_absolute_url": PHOTO, "php_file": "header.php", "line_context": ""},
+                       {"src_absolute_url": PHOTO, "php_file": "/navy-blue-sofa/", "line_context": LONG_CONTEXT}])
+    route_images(df)
+    assert list(df["ai_route"]) == [3, 2]
@@ -0,0 +1,105 @@
+"""Batch mode end to end against the local OpenAI stub server"""
+
+import json
+
+import pandas as pd
+import pytest
+
+openai = pytest.importorskip("openai")
+
+import batch_mode
+import multi_approach_alt_generator as generator
+from batch_mode import read_batch_results, run_batch, split_batch_lines
+from openai_stub_server import StubOpenAIServer
+
+def images(count, duplicates=0):
+    rows = [{"src_absolute_url": f"https://example.com/wp-content/uploads/photo-{i}.jpg",
+             "php_file": f"https://example.com/post-{i}/", "line_context": f"<p>Post {i}</p>", "current_alt": ""}
+            for i in range(count)]
+    return pd.DataFrame(rows + rows[:duplicates])
+
+def request(n):
+    return f"req-{n}", {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": f"alt text {n}"}]}
+
+@pytest.fixture
+def stub(request):
+    with StubOpenAIServer(**getattr(request, "param", {})) as server:
+        yield server, openai.OpenAI(api_key="stub", base_url=server.base_url, max_retries=0)
+
+def test_split_by_request_count_and_size():
+    requests = [request(n) for n in range(5)]
+    assert [len(part) for part in split_batch_lines(requests, max_requests=2)] == [2, 2, 1]
+    line_bytes = len(batch_mode.batch_line(*requests[0]).encode("utf-8"))
+    assert [len(part) for part in split_batch_lines(requests, max_bytes=line_bytes * 3)] == [3, 2]
+    # A request larger than the limit still goes out, alone
+    assert [len(part) for part in split_batch_lines(requests, max_bytes=1)] == [1] * 5
+
+def test_upload_poll_and_output_mapping(stub, tmp_path):
+    server, client = stub
+    df = generator.generate_alt_texts_batch(images(3, duplicates=2), client, 2,
+                                            batch_prefix=str(tmp_path / "batch"), poll_interval=0)
+    assert list(df["ai_analysis_status"]) == ["success"] * 5
+    assert all(alt.startswith("Stub alt text") for alt in df["ai_alt_text"])
+    # Duplicate rows share one request, and get the same answer
+    assert server.state.stats["batch_requests"] == 3
+    assert list(df["ai_alt_text"][3:]) == list(df["ai_alt_text"][:2])
+    lines = (tmp_path / "batch_alt_texts.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["custom_id"] for line in lines] == ["alt-0", "alt-1", "alt-2"]
+    assert all(batch["_polls"] == 2 for batch in server.state.batches.values())
+
+def test_approach_1_runs_two_dependent_batches(stub, tmp_path):
+    server, client = stub
+    df = generator.generate_alt_texts_batch(images(2), client, 1, batch_prefix=str(tmp_path / "batch"), poll_interval=0)
+    assert list(df["ai_analysis_status"]) == ["success"] * 2
+    assert all(description.startswith("Stub description") for description in df["ai_image_description"])
+    assert len(server.state.batches) == 2
+    alt_requests = [json.loads(line) for line in (tmp_path / "batch_alt_texts.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert all("Stub description" in json.dumps(line["body"]["messages"]) for line in alt_requests)
+
+def test_large_runs_are_split_and_merged(stub, tmp_path, monkeypatch):
+    server, client = stub
+    monkeypatch.setattr(batch_mode, "MAX_BATCH_REQUESTS", 2)
+    df = generator.generate_alt_texts_batch(images(5), client, 3, batch_prefix=str(tmp_path / "batch"), poll_interval=0)
+    assert list(df["ai_analysis_status"]) == ["success"] * 5
+    assert len(server.state.batches) == 3
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "batch_alt_texts_1.jsonl", "batch_alt_texts_2.jsonl", "batch_alt_texts_3.jsonl"]
+
+@pytest.mark.parametrize("stub", [{"batch_error_rate": 0.5, "seed": 1}], indirect=True)
+def test_error_file_without_retries(stub, tmp_path, monkeypatch):
+    server, client = stub
+    monkeypatch.setattr(batch_mode, "BATCH_RETRIES", 0)
+    df = generator.generate_alt_texts_batch(images(10), client, 3, batch_prefix=str(tmp_path / "batch"), poll_interval=0)
+    failed = df[df["ai_analysis_status"] == "error"]
+    assert len(failed) == server.state.stats["batch_errors"] > 0
+    assert all(alt == "ERROR: The server had an error (stub)" for alt in failed["ai_alt_text"])
+    assert len(df) - len(failed) > 0
+
+@pytest.mark.parametrize("stub", [{"batch_error_rate": 0.5, "seed": 1}], indirect=True)
+def test_failed_lines_are_retried(stub, tmp_path):
+    server, client = stub
+    df = generator.generate_alt_texts_batch(images(10), client, 3, batch_prefix=str(tmp_path / "batch"), poll_interval=0)
+    assert server.state.stats["batch_errors"] > 0
+    assert len(server.state.batches) > 1
+    # Every retry batch holds only the lines that failed before
+    assert server.state.stats["batch_requests"] == 10 + server.state.stats["batch_errors"] - (df["ai_analysis_status"] == "error").sum()
+    retried = (tmp_path / "batch_alt_texts_retry1.jsonl").read_text(encoding="utf-8").splitlines()
+    assert 0 < len(retried) < 10
+
+def test_client_errors_are_not_retried(stub, tmp_path):
+    server, client = stub
+    requests = [request(0), ("bad", {"model": "gpt-4o-mini", "messages": []})]
+    results = run_batch(client, requests, str(tmp_path / "batch.jsonl"), poll_interval=0, retries=2)
+    assert results["req-0"]["content"].startswith("Stub alt text")
+    assert results["bad"]["retryable"] is False
+    assert "required" in results["bad"]["error"]
+    assert len(server.state.batches) == 1
+
+def test_read_results_from_both_files(stub, tmp_path):
+    server, client = stub
+    server.state.batch_error_rate = 1.0
+    results = run_batch(client, [request(0), request(1)], str(tmp_path / "batch.jsonl"), poll_interval=0, retries=0)
+    assert results == {f"req-{n}": {"error": "The server had an error (stub)", "retryable": True} for n in range(2)}
+    batch = client.batches.retrieve(next(iter(server.state.batches)))
+    assert batch.output_file_id is None
+    assert read_batch_results(client, batch) == results
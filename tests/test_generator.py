@@ -0,0 +1,34 @@
+"""Result handling of the generation engine"""
+
+import pandas as pd
+
+import multi_approach_alt_generator as generator
+from rate_limiter import RateLimitedClient, RateLimiter
+from resilience import FaultInjectingClient
+
+def test_result_buffer_is_emptied_by_apply():
+    df = pd.DataFrame({"src_absolute_url": ["a", "b", "c"]})
+    generator.add_result_columns(df)
+    buffer = generator.ResultBuffer()
+    buffer.add([0, 2], {"success": True, "image_description": "", "alt_text": "Alt", "status": "success"}, 3)
+    buffer.apply(df)
+    assert len(buffer) == 0
+    assert list(df["ai_alt_text"]) == ["Alt", "", "Alt"]
+    buffer.add([1], {"success": False, "error": "boom"}, 3)
+    buffer.apply(df)
+    assert list(df["ai_alt_text"]) == ["Alt", "ERROR: boom", "Alt"]
+    assert list(df["ai_analysis_status"]) == ["success", "error", "success"]
+
+def test_routes_share_one_throttled_limiter():
+    # Route 3 drains the request budget, so route 2 queues on the same limiter lock -
+    # with an event loop per route that lock belonged to the first loop
+    limiter = RateLimiter({"gpt-4o": {"rpm": 120, "tpm": 10 ** 9}, "gpt-4o-mini": {"rpm": 120, "tpm": 10 ** 9}})
+    client = RateLimitedClient(FaultInjectingClient(), limiter, max_retries=0)
+    rows = [{"src_absolute_url": f"https://example.com/uploads/IMG_{i}.jpg", "php_file": f"/post-{i}/",
+             "line_context": "Text", "current_alt": ""} for i in range(126)]
+    df = pd.DataFrame(rows)
+    routes = {3: df.iloc[:122], 2: df.iloc[122:]}
+    generator.generate_routes(df, routes, client, delay=0, concurrency=4)
+    assert list(df["ai_analysis_status"]) == ["success"] * 126
+    assert list(df["ai_approach_used"][120:]) == [generator.APPROACH_NAMES[3]] * 2 + [generator.APPROACH_NAMES[2]] * 4
+    assert limiter.stats["waited_seconds"] > 0
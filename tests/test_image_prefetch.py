@@ -0,0 +1,191 @@
+"""Image prefetch against fixture images served by a local http.server"""
+
+import asyncio
+import base64
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from image_prefetch import ImagePrefetcher, encode_image, target_size
+
+def image_bytes(size, mode="RGB", fmt="JPEG"):
+    output = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else (200, 30, 30)).save(output, format=fmt)
+    return output.getvalue()
+
+def decode(image):
+    header, data = image["url"].split(",", 1)
+    return header, Image.open(io.BytesIO(base64.b64decode(data)))
+
+class ImageServer:
+    """Serves path -> bytes, counts requests and the most requests in flight at once"""
+
+    def __init__(self, files, delay=0.0):
+        self.files = files
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.delay)
+                    data = server.files.get(self.path.split("?")[0])
+                    if data is None:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(files, delay=0.0):
+        servers.append(ImageServer(files, delay))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
+
+def fetch_all(prefetcher, urls):
+    async def run():
+        try:
+            return await asyncio.gather(*(prefetcher.fetch(url) for url in urls))
+        finally:
+            await prefetcher.close()
+    return asyncio.run(run())
+
+def test_target_size():
+    assert target_size(300, 200) == ((300, 200), "low")
+    assert target_size(1024, 512, "low") == ((512, 256), "low")
+    assert target_size(3000, 2000) == ((1152, 768), "high")
+    assert target_size(4000, 1000) == ((2048, 512), "high")
+
+def test_encode_image_downscales_and_keeps_transparency():
+    header, image = decode(encode_image(image_bytes((3000, 2000))))
+    assert header == "data:image/jpeg;base64"
+    assert image.size == (1152, 768)
+    result = encode_image(image_bytes((100, 100), "RGBA", "PNG"))
+    header, image = decode(result)
+    assert header == "data:image/png;base64"
+    assert result["detail"] == "low"
+    assert len(result["hash"]) == 16
+
+def test_fetch_downscales_and_caches(serve, tmp_path):
+    pytest.importorskip("httpx")
+    server = serve({"/large.jpg": image_bytes((3000, 2000)), "/small.png": image_bytes((200, 100), fmt="PNG")})
+    prefetcher = ImagePrefetcher(str(tmp_path), "high")
+    large, small = fetch_all(prefetcher, [f"{server.url}/large.jpg", f"{server.url}/small.png"])
+    assert large["detail"] == "high"
+    assert decode(large)[1].size == (1152, 768)
+    assert small["detail"] == "low"
+    assert decode(small)[1].size == (200, 100)
+    assert prefetcher.stats["downloaded"] == 2
+    assert prefetcher.stats["bytes_sent"] < prefetcher.stats["bytes_downloaded"]
+
+    # A new run reads the disk cache instead of downloading again
+    prefetcher = ImagePrefetcher(str(tmp_path), "high")
+    assert fetch_all(prefetcher, [f"{server.url}/large.jpg"]) == [large]
+    assert prefetcher.stats["cached"] == 1
+    assert server.requests == 2
+
+def test_low_detail_limit(serve, tmp_path):
+    pytest.importorskip("httpx")
+    server = serve({"/large.jpg": image_bytes((3000, 2000))})
+    image, = fetch_all(ImagePrefetcher(str(tmp_path), "low"), [f"{server.url}/large.jpg"])
+    assert image["detail"] == "low"
+    assert decode(image)[1].size == (512, 341)
+
+def test_failures_fall_back_to_url(serve, tmp_path):
+    pytest.importorskip("httpx")
+    server = serve({"/logo.svg": b'<svg xmlns="http://www.w3.org/2000/svg"/>'})
+    urls = [f"{server.url}/missing.jpg", f"{server.url}/logo.svg"]
+    prefetcher = ImagePrefetcher(str(tmp_path))
+    results = fetch_all(prefetcher, urls)
+    assert results == [{"url": url, "detail": "auto", "hash": None} for url in urls]
+    assert prefetcher.stats["failed"] == 2
+    # Failed URLs are not requested again in the same run
+    assert fetch_all(prefetcher, urls) == results
+    assert server.requests == 2
+
+def test_unreachable_host_falls_back_to_url(tmp_path):
+    pytest.importorskip("httpx")
+    url = "http://127.0.0.1:9/photo.jpg"
+    image, = fetch_all(ImagePrefetcher(str(tmp_path), timeout=2), [url])
+    assert image == {"url": url, "detail": "auto", "hash": None}
+
+def test_concurrency_cap(serve, tmp_path):
+    pytest.importorskip("httpx")
+    files = {f"/photo-{i}.jpg": image_bytes((50, 50)) for i in range(8)}
+    server = serve(files, delay=0.1)
+    prefetcher = ImagePrefetcher(str(tmp_path), concurrency=2)
+    fetch_all(prefetcher, [f"{server.url}{path}" for path in files])
+    assert prefetcher.stats["downloaded"] == 8
+    assert server.max_in_flight == 2
+
+def test_same_url_is_downloaded_once(serve, tmp_path):
+    pytest.importorskip("httpx")
+    server = serve({"/photo.jpg": image_bytes((50, 50))}, delay=0.1)
+    results = fetch_all(ImagePrefetcher(str(tmp_path)), [f"{server.url}/photo.jpg"] * 5)
+    assert all(result == results[0] for result in results)
+    assert server.requests == 1
+
+def test_image_stem_key():
+    from image_prefetch import image_stem_key
+    base = "https://example.com/wp-content/uploads/2024/05/"
+    assert image_stem_key(base + "Garden-Party-300x200.jpg") == image_stem_key(base + "garden-party-scaled.webp")
+    assert image_stem_key(base + "garden-party@2x.png") == image_stem_key(base + "garden-party.jpg")
+    assert image_stem_key(base + "garden-party.jpg") != image_stem_key(base.replace("05", "06") + "garden-party.jpg")
+    assert image_stem_key(base + "garden-party.jpg") != image_stem_key(base + "garden-party-2.jpg")
+
+def test_clusters_group_size_variants_by_name():
+    from image_prefetch import ImageClusters
+    clusters = ImageClusters()
+    base = "https://example.com/wp-content/uploads/"
+    assert clusters.match(base + "photo-1024x768.jpg") is None
+    assert clusters.assign(base + "photo.jpg", "0" * 16) == base + "photo.jpg"
+    assert clusters.match(base + "photo-1024x768.jpg") == base + "photo.jpg"
+    # Variants join without a hash - and even when their pixels (hash) differ after cropping
+    assert clusters.assign(base + "photo-1024x768.jpg") == base + "photo.jpg"
+    assert clusters.assign(base + "photo-150x150.jpg", "f" * 16) == base + "photo.jpg"
+    assert clusters.stats == {'images': 3, 'clusters': 1, 'by_name': 2, 'shared': 0}
+
+def test_clusters_group_near_duplicates_by_hash():
+    from image_prefetch import ImageClusters
+    clusters = ImageClusters(max_distance=4)
+    base = "https://example.com/wp-content/uploads/"
+    assert clusters.assign(base + "a.jpg", "00000000000000ff") == base + "a.jpg"
+    assert clusters.assign(base + "b.jpg", "00000000000000f0") == base + "a.jpg"
+    assert clusters.assign(base + "c.jpg", "ffffffff00000000") == base + "c.jpg"
+    assert clusters.assign(base + "d.jpg") == base + "d.jpg"
+    assert clusters.stats['clusters'] == 3
@@ -0,0 +1,92 @@
+"""wp_posts records from mysqldump files and SQLite databases"""
+
+import gzip
+import json
+import sqlite3
+
+import pytest
+
+import post_sources
+import wordpress_image_analyzer as analyzer
+
+# The same rows as a phpMyAdmin JSON export holds them - values as text, NULL as null
+ROWS = [
+    {"ID": "1", "post_content": "<p>It's ours; all of it</p>\r\n<img src=\"/a.jpg\" alt=\"\">", "post_title": "Garden",
+     "post_excerpt": "", "post_status": "publish", "post_type": "post"},
+    {"ID": "2", "post_content": "Values like (1),(2) and '' or ');", "post_title": "Café 'quoted'",
+     "post_excerpt": None, "post_status": "draft", "post_type": "page"},
+    {"ID": "3", "post_content": "tab\there\nnew line \\ backslash", "post_title": "a\\b",
+     "post_excerpt": None, "post_status": "inherit", "post_type": "attachment"},
+]
+
+# Other tables before and after wp_posts; wp_options holds text that looks like a posts INSERT
+DUMP = r"""-- MySQL dump 10.13  Distrib 8.0.36
+/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;
+/*!40101 SET NAMES utf8mb4 */;
+
+DROP TABLE IF EXISTS `wp_options`;
+CREATE TABLE `wp_options` (
+  `option_id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `option_value` longtext NOT NULL,
+  PRIMARY KEY (`option_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+INSERT INTO `wp_options` VALUES (1,'a:1:{s:4:\"post\";}'),(2,'INSERT INTO `wp_posts` VALUES (9,\'x\');');
+INSERT INTO `wp_postmeta` VALUES (1,1,'_wp_attached_file','a.jpg');
+
+DROP TABLE IF EXISTS `wp_posts`;
+CREATE TABLE `wp_posts` (
+  `ID` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `post_content` longtext NOT NULL,
+  `post_title` text NOT NULL,
+  `post_excerpt` text,
+  `post_status` varchar(20) NOT NULL DEFAULT 'publish',
+  `post_type` varchar(20) NOT NULL DEFAULT 'post',
+  PRIMARY KEY (`ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+LOCK TABLES `wp_posts` WRITE;
+INSERT INTO `wp_posts` VALUES (1,'<p>It\'s ours; all of it</p>\r\n<img src=\"/a.jpg\" alt=\"\">','Garden','','publish','post'),(2,'Values like (1),(2) and \'\' or \');','Café ''quoted''',NULL,'draft','page');
+INSERT INTO `wp_posts` (`ID`, `post_type`, `post_status`, `post_title`, `post_content`, `post_excerpt`) VALUES (3,'attachment','inherit','a\\b','tab\there\nnew line \\ backslash',NULL);
+UNLOCK TABLES;
+
+DROP TABLE IF EXISTS `wp_users`;
+CREATE TABLE `wp_users` (
+  `ID` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `user_login` varchar(60) NOT NULL DEFAULT ''
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+INSERT INTO `wp_users` VALUES (1,'admin;(x),(y)');
+"""
+
+def exported_rows(tmp_path):
+    """ROWS read back through load_wp_posts from a phpMyAdmin-style JSON export"""
+    path = tmp_path / "export.json"
+    export = [{"type": "header", "version": "5.2.1"}, {"type": "database", "name": "wordpress"},
+              {"type": "table", "name": "wp_posts", "database": "wordpress", "data": ROWS}]
+    path.write_text(json.dumps(export), encoding="utf-8")
+    return list(analyzer.load_wp_posts(str(path)))
+
+@pytest.mark.parametrize("compressed", [False, True], ids=["sql", "gz"])
+@pytest.mark.parametrize("chunk_size", list(range(1, 41)) + [1 << 20])
+def test_sql_dump_matches_json_export(tmp_path, chunk_size, compressed):
+    if compressed:
+        path = tmp_path / "dump.sql.gz"
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+            f.write(DUMP)
+    else:
+        path = tmp_path / "dump.sql"
+        path.write_bytes(DUMP.encode("utf-8"))
+    records = list(post_sources.load_wp_posts_sql(str(path), chunk_size=chunk_size))
+    assert records == exported_rows(tmp_path)
+
+def test_sqlite_round_trip(tmp_path):
+    path = tmp_path / "site.sqlite"
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE wp_postmeta (meta_id INTEGER, post_id INTEGER, meta_key TEXT)")
+    connection.execute("INSERT INTO wp_postmeta VALUES (1, 1, '_wp_attached_file')")
+    connection.execute("CREATE TABLE wp_posts (ID INTEGER PRIMARY KEY, post_content TEXT, post_title TEXT, "
+                       "post_excerpt TEXT, post_status TEXT, post_type TEXT)")
+    connection.executemany("INSERT INTO wp_posts VALUES (?, ?, ?, ?, ?, ?)",
+                           [(int(row["ID"]),) + tuple(row[name] for name in list(row)[1:]) for row in ROWS])
+    connection.commit()
+    connection.close()
+
+    assert list(analyzer.load_posts(str(path))) == exported_rows(tmp_path)
@@ -0,0 +1,149 @@
+"""Retries, error classification, timeouts and the circuit breaker - offline, with FaultInjectingClient"""
+
+import asyncio
+import time
+
+import pytest
+
+from rate_limiter import RateLimitedClient, RateLimiter
+from resilience import (FATAL, RATE_LIMITED, RETRYABLE, CircuitBreaker, FaultInjectingClient, RequestTimeout,
+                        ResilientClient, api_error, classify_error)
+
+REQUEST = {"model": "gpt-4o", "messages": [{"role": "user", "content": "alt text please"}]}
+
+def resilient(failures=(), max_retries=3, timeout=1.0, breaker=None, latency=0.0):
+    fake = FaultInjectingClient(failures, latency=latency)
+    return fake, ResilientClient(fake, breaker, max_retries, timeout, backoff_base=0.001, backoff_cap=0.01)
+
+def create(client):
+    return asyncio.run(client.chat.completions.create(**REQUEST))
+
+def test_classify_without_http_status():
+    assert classify_error(RequestTimeout("slow")) == RETRYABLE
+    assert classify_error(asyncio.TimeoutError()) == RETRYABLE
+    assert classify_error(ValueError("bug")) == FATAL
+
+def test_classify_http_statuses():
+    pytest.importorskip("httpx")
+    assert classify_error(api_error(500)) == RETRYABLE
+    assert classify_error(api_error(503)) == RETRYABLE
+    assert classify_error(api_error(408)) == RETRYABLE
+    assert classify_error(api_error(429)) == RATE_LIMITED
+    assert classify_error(api_error(429, code="insufficient_quota")) == FATAL
+    assert classify_error(api_error(400)) == FATAL
+    assert classify_error(api_error(401)) == FATAL
+
+def test_retryable_errors_are_retried():
+    fake, client = resilient([RequestTimeout("slow"), RequestTimeout("slow")])
+    response = create(client)
+    assert response.choices[0].message.content == "Injected alt text"
+    assert fake.calls == 3
+    assert client.stats == {"retries": 2, "timeouts": 0, "failed": 0}
+
+def test_retryable_http_errors_are_retried():
+    pytest.importorskip("httpx")
+    fake, client = resilient([500, 429, "connection"])
+    create(client)
+    assert fake.calls == 4
+    assert client.stats["retries"] == 3
+
+def test_fatal_error_is_raised_at_once():
+    fake, client = resilient([ValueError("bad request")])
+    with pytest.raises(ValueError):
+        create(client)
+    assert fake.calls == 1
+    assert client.stats == {"retries": 0, "timeouts": 0, "failed": 1}
+
+def test_fatal_http_error_is_raised_at_once():
+    pytest.importorskip("httpx")
+    fake, client = resilient([400, None])
+    with pytest.raises(Exception) as error:
+        create(client)
+    assert classify_error(error.value) == FATAL
+    assert fake.calls == 1
+
+def test_retries_are_limited():
+    fake, client = resilient([RequestTimeout("slow")] * 5, max_retries=2)
+    with pytest.raises(RequestTimeout):
+        create(client)
+    assert fake.calls == 3
+    assert client.stats["failed"] == 1
+
+def test_hanging_request_times_out_and_is_retried():
+    fake, client = resilient(["timeout"], timeout=0.05)
+    create(client)
+    assert fake.calls == 2
+    assert client.stats["timeouts"] == 1
+    assert client.stats["retries"] == 1
+
+def test_rate_limiter_wait_is_not_a_timeout():
+    # Healthy API, but every request first waits 0.3s for rate limit budget - longer than the timeout
+    limiter = RateLimiter({"gpt-4o": {"rpm": 1000, "tpm": 10 ** 9}})
+    limiter.pause("gpt-4o", 0.3)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    fake = FaultInjectingClient()
+    client = ResilientClient(RateLimitedClient(fake, limiter, max_retries=0), breaker, max_retries=0, timeout=0.1)
+
+    async def run():
+        return await asyncio.gather(*(client.chat.completions.create(**REQUEST) for _ in range(3)))
+
+    assert len(asyncio.run(run())) == 3
+    assert client.stats == {"retries": 0, "timeouts": 0, "failed": 0}
+    assert breaker.state == "closed"
+    assert breaker.stats["opened"] == 0
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.stats["opened"] == 1
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_breaker_half_open_probe():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        start = time.monotonic()
+        await breaker.wait()
+        assert time.monotonic() - start >= 0.04
+        assert breaker.state == "half_open"
+        # Failed probe opens the breaker again
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.stats["opened"] == 2
+        await breaker.wait()
+        breaker.record_success()
+        assert breaker.state == "closed"
+    asyncio.run(run())
+
+def test_breaker_pause_is_counted_once():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+        breaker.record_failure()
+
+        async def request():
+            await breaker.wait()
+            breaker.record_success()
+
+        await asyncio.gather(*(request() for _ in range(10)))
+        return breaker
+    breaker = asyncio.run(run())
+    assert breaker.state == "closed"
+    assert 0.09 <= breaker.stats["waited_seconds"] < 0.5
+
+def test_breaker_pauses_dispatch_in_client():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    fake, client = resilient([RequestTimeout("down")] * 3, max_retries=5, breaker=breaker)
+    create(client)
+    assert fake.calls == 4
+    assert breaker.stats["opened"] >= 1
+    assert breaker.state == "closed"
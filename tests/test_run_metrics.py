@@ -0,0 +1,39 @@
+"""Progress line and log routing"""
+
+import io
+
+import run_metrics
+from run_metrics import ProgressLine, log
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+def test_log_goes_through_active_progress_line(capsys):
+    terminal = Terminal()
+    progress = ProgressLine(10, interval=0, stream=terminal)
+    progress.update(3, 3)
+    log("    Retrying in 1.0s (RequestTimeout, attempt 1/3)")
+    progress.update(1, 1)
+    progress.close()
+    output = terminal.getvalue()
+    assert "\r\033[K    Retrying in 1.0s (RequestTimeout, attempt 1/3)\n" in output
+    assert output.index("[3/10]") < output.index("Retrying") < output.index("[4/10]")
+    assert capsys.readouterr().out == ""
+
+    # Without a progress line, messages are printed as usual
+    log("Prefetch failed")
+    assert capsys.readouterr().out == "Prefetch failed\n"
+    assert run_metrics._active_progress is None
+
+def test_progress_line_without_terminal():
+    stream = io.StringIO()
+    progress = ProgressLine(2, "Approach ", interval=0, stream=stream)
+    progress.update(1, 1)
+    log("ERROR: something")
+    progress.update(1, 0)
+    progress.close()
+    lines = stream.getvalue().splitlines()
+    assert lines[0].startswith("Approach [1/2] 1 successful")
+    assert lines[1] == "ERROR: something"
+    assert lines[2].startswith("Approach [2/2] 1 successful")
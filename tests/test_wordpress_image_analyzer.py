@@ -0,0 +1,137 @@
+"""Export parsing, image extraction and the scan outputs"""
+
+import json
+import random
+import re
+import time
+
+import pandas as pd
+import pytest
+
+import post_sources
+import wordpress_image_analyzer as analyzer
+from scan_index import ScanIndex
+
+POST = {'ID': '1', 'post_title': 'Garden', 'post_type': 'post', 'post_status': 'publish', 'post_name': 'garden',
+        'post_content': '<p>Our garden in May</p><img src="/wp-content/uploads/garden.jpg" alt="">'}
+
+def test_empty_delta_replaces_previous_delta(tmp_path):
+    path = str(tmp_path / "delta.xlsx")
+    images, _ = analyzer.scan_post(POST, 'https://example.com')
+    analyzer.save_delta_to_excel([dict(image, change='added') for image in images], path)
+    assert len(pd.read_excel(path, sheet_name='Needs_Alt_Text')) == 1
+
+    analyzer.save_delta_to_excel([], path)
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert list(sheets) == ['Delta', 'Needs_Alt_Text']
+    assert all(sheet.empty for sheet in sheets.values())
+    assert tuple(sheets['Delta'].columns) == analyzer.DELTA_COLUMNS
+
+def test_delta_columns_match_image_rows():
+    images, _ = analyzer.scan_post(POST, 'https://example.com')
+    assert tuple(images[0]) + ('change',) == analyzer.DELTA_COLUMNS
+
+def test_changed_post_delta_lists_dropped_images(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    deltas = []
+    for content in ('<img src="/a.jpg" alt=""><img src="/b.jpg" alt="">', '<p>Edited</p><img src="/a.jpg" alt="">', '<p>No images</p>'):
+        index = ScanIndex(path)
+        list(analyzer.iter_images([dict(POST, post_content=content)], 'https://example.com', index=index, verbose=False))
+        deltas.append(sorted((image['img_src'], image['change']) for image in index.finish()))
+        index.close()
+
+    assert deltas == [
+        [('/a.jpg', 'added'), ('/b.jpg', 'added')],
+        [('/a.jpg', 'changed'), ('/b.jpg', 'removed')],
+        [('/a.jpg', 'removed')],
+    ]
+
+# Scalars outside the records (header fields, table metadata) are decoded one at a time
+EXPORT = [
+    {"type": "header", "version": "5.2.1", "generated": 1712345678, "ratio": -0.125e-2},
+    {"type": "database", "name": "wordpress"},
+    {"type": "table", "name": "wp_posts", "rows": 123456789, "size": 3.5e10, "data": [
+        {"ID": 12345, "menu_order": -7, "score": 1.5e10, "ratio": -0.25, "tiny": 2.5E-3, "flag": True, "none": None},
+        {"ID": 678, "post_title": "Caf\u00e9 \"quoted\"", "nested": [1, 22, 333.5], "last": 9}
+    ]}
+]
+
+@pytest.mark.parametrize("chunk_size", range(1, 41))
+def test_json_export_numbers_across_chunk_boundaries(tmp_path, chunk_size):
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps(EXPORT), encoding="utf-8")
+    assert list(analyzer.load_wp_posts(str(path), chunk_size)) == EXPORT[2]["data"]
+
+@pytest.mark.parametrize("chunk_size", range(1, 12))
+def test_json_stream_scalars_across_chunk_boundaries(tmp_path, chunk_size):
+    values = [12345, -0.25, 1.5e10, 2.5E-3, 7, True, None, "x"]
+    path = tmp_path / "values.json"
+    path.write_text(json.dumps(values), encoding="utf-8")
+    assert list(analyzer.load_wp_posts(str(path), chunk_size)) == values
+
+def legacy_images(post_content):
+    """find_all_images before the tokenizer - <img[^>]*> plus quoted src/alt searches (the oracle)"""
+    images = []
+    for match in re.finditer(r'<img[^>]*>', post_content, re.IGNORECASE):
+        img_tag = match.group(0)
+        src_match = re.search(r'src=["\']([^"\']+)["\']', img_tag, re.IGNORECASE)
+        alt_match = re.search(r'alt=["\']([^"\']*)["\']', img_tag, re.IGNORECASE)
+        images.append((match.start(), img_tag, src_match.group(1) if src_match else None,
+                       alt_match.group(1) if alt_match else None))
+    return images
+
+def random_post(rng):
+    """Post HTML mixing quoted and unquoted attributes, apostrophes in unquoted values and in text
+    (quoted values hold no quotes - the oracle's alt search stops at any quote)"""
+    parts = []
+    for i in range(rng.randint(1, 8)):
+        src = f"https://example.com/wp-content/uploads/photo-{i}.jpg"
+        alt = rng.choice(["", "A red bike", "Sunset"])
+        attrs = [rng.choice([f'src="{src}"', f"src='{src}'", f"src={src}"])]
+        attrs.append(rng.choice([f'alt="{alt}"', f"alt='{alt}'", "alt=Bob's", "title=Anna's", 'class="wp-image-7"',
+                                 "width=300", "data-note=it's"]))
+        rng.shuffle(attrs)
+        parts.append(rng.choice(["<p>Bob's photo:</p>", "<h2>Tom's trip</h2>", "<!-- wp:image -->", "It's here. "]))
+        parts.append(f"<img {' '.join(attrs)}{rng.choice(['', ' /', '/'])}>")
+    return "\n".join(parts)
+
+def test_tokenizer_matches_legacy_parser():
+    rng = random.Random(5)
+    for _ in range(300):
+        content = random_post(rng)
+        legacy = legacy_images(content)
+        images = analyzer.tokenize_post(content)[0]
+        # Same tags at the same offsets - also when an unquoted value holds an apostrophe
+        assert [(image['start'], image['tag']) for image in images] == [(start, tag) for start, tag, _, _ in legacy]
+        for image, (_, tag, src, alt) in zip(images, legacy):
+            if src is not None:
+                assert image['attrs']['src'] == src, tag
+            if alt is not None:
+                assert image['attrs']['alt'] == alt, tag
+
+def test_apostrophe_in_unquoted_value():
+    images, _ = analyzer.tokenize_post("<p>x</p><img src=a.jpg alt=Bob's><p>Bob's</p><img src='b.jpg' alt=\"it's\">")
+    assert [image['attrs'] for image in images] == [{'src': 'a.jpg', 'alt': "Bob's"}, {'src': 'b.jpg', 'alt': "it's"}]
+
+# Possessive quantifiers and atomic groups need Python 3.11 - re.compile fails on 3.9/3.10
+PYTHON_311_REGEX_SYNTAX = re.compile(r'(?<!\\)[*+?}]\+|\(\?>')
+
+@pytest.mark.parametrize("module", [analyzer, post_sources])
+def test_patterns_compile_before_python_311(module):
+    patterns = [value for value in vars(module).values() if isinstance(value, re.Pattern)]
+    assert patterns
+    for pattern in patterns:
+        assert not PYTHON_311_REGEX_SYNTAX.search(pattern.pattern), pattern.pattern
+
+# Tags that never close (no '>' anywhere after them) - the img alternative must fail without backtracking
+@pytest.mark.parametrize("content", [
+    '<img ' + 'a="x" b=\'y\' c=z ' * 5000,
+    '<img ' + 'alt="' * 5000,
+    '<img ' + "alt=Bob's " * 5000,
+    ('<img src="a.jpg" ' + '=' * 2000 + '"') * 20,
+], ids=["quoted", "open-quotes", "apostrophes", "equals"])
+def test_unclosed_tags_fail_fast(content):
+    start = time.perf_counter()
+    images, _ = analyzer.tokenize_post(content)
+    assert time.perf_counter() - start < 1.0
+    assert images == []